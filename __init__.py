@@ -8,10 +8,9 @@ import fcntl
 import struct
 import warnings
 import datetime
-import threading
 from time import gmtime, strftime
 from modules import app, cbpi
-from .i2c import CharLCD
+from .displays import DisplayConfig, DisplayRegistry, parse_displays, prometheus_metrics
 
 # LCDVERSION = '4.0.00' The LCD-library and LCD-driver are taken from RPLCD Project version 1.0. The documentation:
 # http://rplcd.readthedocs.io/en/stable/ very good and readable. Git is here: https://github.com/dbrgn/RPLCD.
@@ -34,9 +33,18 @@ from .i2c import CharLCD
 # 15.03.2020 skip delays in  fermentation Multi mode
 # 20.03.2020 added ÄÖÜß for A00 Charactermap, Charactermap is
 # selectable in Parameter [A00, A02]. The Character maps are implemented into the LCD by factory. Changed cooling symbol
+# 18.10.2026 several LCDs (parameter LCD_Displays), each one with its own render worker
+# 18.10.2026 driver counters and render durations at /api/lcddisplay/metrics (Prometheus format)
+# 18.10.2026 page changes overwrite the previous page instead of clearing the LCD, only changed letters are sent
+# 18.10.2026 custom characters (symbols, ÄÖÜß) are uploaded when a screen needs them instead of fixed at start
+# 18.10.2026 step, kettle, fermenter and brewery names longer than their field scroll
+# 18.10.2026 on 16x2 and 20x2 LCDs the next kettle or fermenter page is written hidden and shown at once
+# 18.10.2026 40x4 LCDs (two controllers) on a MCP23008 or MCP23017, the second E line on GP0
+# 18.10.2026 batched mode and I2C transport per display, batched mode is off on one bank of a MCP23017
+# 18.10.2026 e2= in LCD_Displays for the pin of the second E line of a 40x4 LCD
+# 18.10.2026 waits and holds of the I2C bus arbiter at /api/lcddisplay/metrics
 
 DEBUG = False  # turn True to show more debug info
-BLINK = False  # start value for blinking the beerglass during heating only for single mode
 # beerglass symbol
 bierkrug = (
     0b11100,
@@ -104,15 +112,24 @@ esszett = (
     0b10000
 )
 
+# Glyphs of the CGRAM, uploaded when a screen needs them. The letters are only used with the A00 charactermap.
+lcd_glyphs = {
+    "bierkrug": bierkrug,
+    "cool": cool,
+    "Ä": awithdots,
+    "Ö": owithdots,
+    "Ü": uwithdots,
+    "ß": esszett,
+}
 
-def lcd(LCDaddress, characters):
-    try:
-        lcd = CharLCD(i2c_expander='PCF8574', address=LCDaddress, port=1, cols=20, rows=4, dotsize=8,
-                      charmap=characters,
-                      auto_linebreaks=True, backlight_enabled=True)
-        return lcd
-    except:
-        pass
+
+displays = DisplayRegistry()
+
+
+@cbpi.app.route('/api/lcddisplay/metrics')
+def lcd_metrics():
+    # counters of the LCD drivers and render durations of the screens, for Prometheus
+    return prometheus_metrics(displays), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
 
 
 def set_lcd_address():
@@ -135,6 +152,19 @@ def set_charmap():
     return charmap
 
 
+def set_displays():
+    value = cbpi.get_config_parameter('LCD_Displays', None)
+    if value is None:
+        cbpi.add_config_parameter('LCD_Displays', '', 'string',
+                                  'More than one LCD: address@port colsxrows charmap expander kettle=id '
+                                  'mirror=address@port batched=on|off transport=i2c-dev|smbus e2=pin (40x4), '
+                                  'separated by ";" e.g. "0x27@1 20x4 A00; 0x26@1 kettle=2". '
+                                  'Empty: only LCD_Address. CBPi reboot required')
+        value = cbpi.get_config_parameter('LCD_Displays', None)
+        cbpi.app.logger.info("LCDDisplay  - set_displays added: %s" % value)
+    return value
+
+
 def set_parameter_refresh():
     ref = cbpi.get_config_parameter('LCD_Refresh', None)
     if ref is None:
@@ -202,7 +232,8 @@ def get_version_fo(path):
         return version
 
 
-def show_multidisplay(refresh, charmap):
+def show_multidisplay(display, refresh):
+    charmap = display.config.charmap
     s = cbpi.cache.get("active_step")
     for idx, value in list(cbpi.cache["kettle"].items()):
         current_sensor_value = (cbpi.get_sensor_value(value.sensor))
@@ -210,15 +241,20 @@ def show_multidisplay(refresh, charmap):
         heater_of_kettle = int(cbpi.cache.get("kettle").get(value.id).heater)
         heater_status = int(cbpi.cache.get("actors").get(heater_of_kettle).state)
 
-        line1 = ('%s' % (cbidecode(s.name, charmap))[:20])
+        line1 = ('%s' % (cbidecode(s.name, charmap, display))[:20])
+        # names longer than their field scroll, the symbol keeps the last cell of line1
+        scroll = [(0, 0, 19, cbidecode(s.name, charmap, display))]
 
         # line2 when steptimer is running show remaining time and kettlename
         try:
             if s.timer_end is not None:
                 time_remaining = time.strftime("%H:%M:%S", time.gmtime(s.timer_end - time.time()))
-                line2 = (("%s %s" % (cbidecode(value.name, charmap).ljust(12)[:11], time_remaining)).ljust(20)[:20])
+                line2 = (("%s %s" % (cbidecode(value.name, charmap, display).ljust(12)[:11],
+                                     time_remaining)).ljust(20)[:20])
+                scroll.append((1, 0, 11, cbidecode(value.name, charmap, display)))
             else:
-                line2 = ('%s' % cbidecode(value.name, charmap))[:20]
+                line2 = ('%s' % cbidecode(value.name, charmap, display))[:20]
+                scroll.append((1, 0, 20, cbidecode(value.name, charmap, display)))
         except:
             line2 = "no kettle name"
             pass
@@ -234,23 +270,16 @@ def show_multidisplay(refresh, charmap):
             cbpi.app.logger.info("LCDDisplay  - current_sensor_value exception %s" % current_sensor_value)
             line4 = ("Curr. Temp: %s" % "No Data")[:20]
 
-        lcd.clear()
-        lcd.cursor_pos = (0, 0)
-        lcd.write_string(line1)
-        lcd.cursor_pos = (0, 19)
         if heater_status != 0:
-            lcd.write_string("\x00")
-        lcd.cursor_pos = (1, 0)
-        lcd.write_string(line2)
-        lcd.cursor_pos = (2, 0)
-        lcd.write_string(line3)
-        lcd.cursor_pos = (3, 0)
-        lcd.write_string(line4)
+            display.draw([line1, line2, line3, line4], display.glyph("bierkrug", "#"), scroll, flip=True)
+        else:
+            display.draw([line1, line2, line3, line4], scroll=scroll, flip=True)
         time.sleep(refresh)
     pass
 
 
-def show_singlemode(kettleid1, blink, charmap):
+def show_singlemode(display, kettleid1, blink):
+    charmap = display.config.charmap
     s = cbpi.cache.get("active_step")
 
     # read the current temperature of kettle with kettleid1 from parameters
@@ -264,16 +293,20 @@ def show_singlemode(kettleid1, blink, charmap):
     # cbpi.app.logger.info("LCDDisplay  - heater status (0=off, 1=on) %s" % (heater_status))
 
     # line1 the stepname
-    line1 = ('%s' % (cbidecode(s.name, charmap)).ljust(20)[:20])
+    line1 = ('%s' % (cbidecode(s.name, charmap, display)).ljust(20)[:20])
+    # names longer than their field scroll, the symbol keeps the last cell of line1
+    scroll = [(0, 0, 19, cbidecode(s.name, charmap, display))]
 
     # line2 when steptimer is running show remaining time and kettlename
     if s.timer_end is not None:
         time_remaining = time.strftime("%H:%M:%S", time.gmtime(s.timer_end - time.time()))
         line2 = (("%s %s" % (
-            cbidecode(cbpi.cache.get("kettle")[kettleid1].name, charmap).ljust(12)[:11], time_remaining)).ljust(20)[
-                 :20])
+            cbidecode(cbpi.cache.get("kettle")[kettleid1].name, charmap, display).ljust(12)[:11],
+            time_remaining)).ljust(20)[:20])
+        scroll.append((1, 0, 11, cbidecode(cbpi.cache.get("kettle")[kettleid1].name, charmap, display)))
     else:
-        line2 = (('%s' % (cbidecode(cbpi.cache.get("kettle")[kettleid1].name, charmap))).ljust(20)[:20])
+        line2 = (('%s' % (cbidecode(cbpi.cache.get("kettle")[kettleid1].name, charmap, display))).ljust(20)[:20])
+        scroll.append((1, 0, 20, cbidecode(cbpi.cache.get("kettle")[kettleid1].name, charmap, display)))
 
     # line3
     line3 = ("Targ. Temp:%6.2f%s%s" % (float(cbpi.cache.get("kettle")[kettleid1].target_temp), "°", lcd_unit)).ljust(
@@ -288,22 +321,14 @@ def show_singlemode(kettleid1, blink, charmap):
             "LCDDisplay  - single mode current_sensor_value_id1 exception %s" % current_sensor_value_id1)
         line4 = ("Curr. Temp: %s" % "No Data")[:20]
 
-    lcd.cursor_pos = (0, 0)
-    lcd.write_string(line1)
-    lcd.cursor_pos = (0, 19)
     if blink is False and heater_status != 0:
-        lcd.write_string("\x00")
+        display.draw([line1, line2, line3, line4], display.glyph("bierkrug", "#"), scroll)
     else:
-        lcd.write_string(" ")
-    lcd.cursor_pos = (1, 0)
-    lcd.write_string(line2)
-    lcd.cursor_pos = (2, 0)
-    lcd.write_string(line3)
-    lcd.cursor_pos = (3, 0)
-    lcd.write_string(line4)
+        display.draw([line1, line2, line3, line4], " ", scroll)
 
 
-def show_fermentation_multidisplay(refresh, charmap):
+def show_fermentation_multidisplay(display, refresh):
+    charmap = display.config.charmap
     for idx, value in list(cbpi.cache["fermenter"].items()):
         current_sensor_value = (cbpi.get_sensor_value(value.sensor))
         # INFO value = modules.fermenter.Fermenter
@@ -331,7 +356,10 @@ def show_fermentation_multidisplay(refresh, charmap):
             fcooler_status = 0
         pass
 
-        line1 = ('%s' % (cbidecode(value.brewname, charmap))[:20])
+        line1 = ('%s' % (cbidecode(value.brewname, charmap, display))[:20])
+        # names longer than their field scroll, the symbol keeps the last cell of line1
+        scroll = [(0, 0, 19, cbidecode(value.brewname, charmap, display))]
+        name_width = 20
         # line2
         z = 0
         # todo: line2 = u"no kettle name"
@@ -339,10 +367,12 @@ def show_fermentation_multidisplay(refresh, charmap):
             # INFO value1 = modules.fermenter.FermenterStep
             # cbpi.app.logger.info("LCDDisplay  - value1 %s" % (value1.fermenter_id))
             if value1.timer_start is not None and value1.fermenter_id == value.id:
-                line2 = interval(cbidecode(value.name, charmap), (value1.timer_start - time.time()))
+                line2 = interval(cbidecode(value.name, charmap, display), (value1.timer_start - time.time()))
+                # interval() leaves 7 letters for the name if there are days left, else 10
+                name_width = 7 if value1.timer_start - time.time() >= 60 * 60 * 24 else 10
                 z = 1
             elif z == 0:
-                line2 = ('%s' % (cbidecode(value.name, charmap))[:20])
+                line2 = ('%s' % (cbidecode(value.name, charmap, display))[:20])
             pass
 
         # line3
@@ -358,20 +388,13 @@ def show_fermentation_multidisplay(refresh, charmap):
             line4 = ("Curr. Temp: %s" % "No Data")[:20]
         pass
 
-        lcd.clear()
-        lcd.cursor_pos = (0, 0)
-        lcd.write_string(line1)
-        lcd.cursor_pos = (0, 19)
+        scroll.append((1, 0, name_width, cbidecode(value.name, charmap, display)))
         if fheater_status != 0:
-            lcd.write_string("\x00")
-        if fcooler_status != 0:
-            lcd.write_string("\x01")
-        lcd.cursor_pos = (1, 0)
-        lcd.write_string(line2)
-        lcd.cursor_pos = (2, 0)
-        lcd.write_string(line3)
-        lcd.cursor_pos = (3, 0)
-        lcd.write_string(line4)
+            display.draw([line1, line2, line3, line4], display.glyph("bierkrug", "#"), scroll, flip=True)
+        elif fcooler_status != 0:
+            display.draw([line1, line2, line3, line4], display.glyph("cool", "*"), scroll, flip=True)
+        else:
+            display.draw([line1, line2, line3, line4], scroll=scroll, flip=True)
 
         time.sleep(refresh)
     pass
@@ -385,25 +408,26 @@ def is_fermenter_step_running():
             pass
 
 
-def show_standby(ipdet, cbpi_version, charmap):
-    lcd.cursor_pos = (0, 0)
-    lcd.write_string(("CraftBeerPi %s" % cbpi_version).ljust(20))
-    lcd.cursor_pos = (1, 0)
-    lcd.write_string(
-        ("%s" % (cbidecode(cbpi.get_config_parameter("brewery_name", "No Brewery"), charmap))).ljust(20)[:20])
-    lcd.cursor_pos = (2, 0)
-    lcd.write_string(("IP: %s" % ipdet).ljust(20)[:20])
-    lcd.cursor_pos = (3, 0)
-    lcd.write_string((strftime("%Y-%m-%d %H:%M:%S", time.localtime())).ljust(20))
+def show_standby(display, ipdet, cbpi_version):
+    charmap = display.config.charmap
+    line1 = ("CraftBeerPi %s" % cbpi_version).ljust(20)
+    line2 = ("%s" % (cbidecode(cbpi.get_config_parameter("brewery_name", "No Brewery"), charmap,
+                               display))).ljust(20)[:20]
+    line3 = ("IP: %s" % ipdet).ljust(20)[:20]
+    line4 = (strftime("%Y-%m-%d %H:%M:%S", time.localtime())).ljust(20)
+    scroll = [(1, 0, 20, cbidecode(cbpi.get_config_parameter("brewery_name", "No Brewery"), charmap, display))]
+    display.draw([line1, line2, line3, line4], scroll=scroll)
     pass
 
 
-def cbidecode(string, charmap="A00"):  # Changes some german Letters to be displayed
+def cbidecode(string, charmap="A00", display=None):  # Changes some german Letters to be displayed
     # todo:  check if A00 is used and skip changes if A02 ist used
-    if charmap == "A00":
+    if charmap == "A00" and display is not None:
         if DEBUG: cbpi.app.logger.info('LCDDisplay  - string: %s' % string)
-        replaced_text = string.replace("Ä", "\x02").replace("Ö", "\x03").replace("Ü", "\x04").replace("ß",
-                                                                                                            "\x05")
+        replaced_text = string
+        for letter, fallback in (("Ä", "A"), ("Ö", "O"), ("Ü", "U"), ("ß", "ss")):
+            if letter in replaced_text:
+                replaced_text = replaced_text.replace(letter, display.glyph(letter, fallback))
         if DEBUG: cbpi.app.logger.info('LCDDisplay  - replaced_text: %s' % replaced_text)
         return replaced_text
     else:
@@ -455,6 +479,16 @@ def init(cbpi):
     characters = str(set_charmap())
     cbpi.app.logger.info("LCDDisplay  - character map used %s" % characters)
 
+    try:
+        configs = parse_displays(set_displays(), characters)
+    except ValueError as e:
+        cbpi.notify('LCD_Displays is wrong', str(e), type='danger', timeout=None)
+        configs = []
+    if not configs:
+        configs = [DisplayConfig(name=set_lcd_address(), address=LCDaddress, port=1, cols=20, rows=4,
+                                 charmap=characters, expander='PCF8574', gpio_bank=None, kettle=None,
+                                 mirrors=())]
+
     # This is just for the logfile at start
     refreshlog = float(set_parameter_refresh())
     cbpi.app.logger.info('LCDDisplay  - Refreshrate %s' % refreshlog)
@@ -467,18 +501,17 @@ def init(cbpi):
     id1log = int(set_parameter_id1())
     cbpi.app.logger.info("LCDDisplay  - Kettlenumber used %s" % id1log)
 
-    global lcd
-    try:
-        lcd = lcd(LCDaddress, characters)
-        lcd.create_char(0, bierkrug)                # u"\x00"  -->beerglass symbol
-        lcd.create_char(1, cool)                    # u"\x01"  -->Ice symbol
-        lcd.create_char(2, awithdots)               # u"\x02"  -->Ä
-        lcd.create_char(3, owithdots)               # u"\x03"  -->Ö
-        lcd.create_char(4, uwithdots)               # u"\x04"  -->Ü
-        lcd.create_char(5, esszett)                 # u"\x05"  -->ß
-    except:
-        cbpi.notify('LCD Address is wrong', 'Change LCD Address in parameters, to detect comand promt in Raspi: sudo '
-                                            'i2cdetect -y 1', type='danger', timeout=None)
+    for config in configs:
+        display = displays.add(config)
+        try:
+            display.open()
+            for name, bitmap in lcd_glyphs.items():
+                display.glyphs.register(name, bitmap)   # uploaded when a screen shows it
+            cbpi.app.logger.info("LCDDisplay  - display %s opened" % config.name)
+        except:
+            cbpi.notify('LCD Address is wrong', 'Change LCD Address %s in parameters, to detect comand promt in '
+                                                'Raspi: sudo i2cdetect -y %d' % (config.name, config.port),
+                        type='danger', timeout=None)
 
     global lcd_unit
     try:
@@ -508,44 +541,32 @@ def init(cbpi):
 
         ip = set_ip()
 
-        character_map = characters
-
-        if stepname is not None and multidisplay_status == "on":
-            threadnames = str(threading.enumerate())
-            if "<Thread(multidisplay," in threadnames:
-                if DEBUG: cbpi.app.logger.info("NextionDisplay  - threads Thread multidisplay detected")
+        # every display renders on its own worker, a display that is still busy (e.g. cycling through
+        # the kettles) skips this round
+        for display in displays:
+            if display.lcd is None:
+                continue
+            if display.busy:
+                if DEBUG: cbpi.app.logger.info("LCDDisplay  - display %s busy" % display.config.name)
+                continue
+
+            if stepname is not None and (multidisplay_status == "off" or display.config.kettle is not None):
+                kettleid = display.config.kettle
+                if kettleid is None:
+                    kettleid = int(set_parameter_id1())
+                display.submit(show_singlemode, kettleid, display.blink)
+                display.blink = not display.blink
                 pass
-            else:
-                t_multidisplay = threading.Thread(target=show_multidisplay, name='multidisplay',
-                                                  args=(refresh_time, character_map))
-                t_multidisplay.start()
-                if DEBUG: cbpi.app.logger.info("NextionDisplay  - threads Thread multidisplay started")
-            pass
 
-        elif stepname is not None and multidisplay_status == "off":
-            global BLINK
-            if BLINK is False:
-                show_singlemode(int(set_parameter_id1()), BLINK, character_map)
-                BLINK = True
-            else:
-                show_singlemode(int(set_parameter_id1()), BLINK, character_map)
-                BLINK = False
-            pass
+            elif stepname is not None and multidisplay_status == "on":
+                display.submit(show_multidisplay, refresh_time)
+                pass
 
-        elif is_fermenter_step_running() == "active":
-            threadnames = str(threading.enumerate())
-            if "<Thread(fermentation_multidisplay," in threadnames:
-                if DEBUG: cbpi.app.logger.info("NextionDisplay  - threads Thread fermentation_multidisplay detected")
+            elif is_fermenter_step_running() == "active":
+                display.submit(show_fermentation_multidisplay, refresh_time)
                 pass
+
             else:
-                t_ferm_multidisplay = threading.Thread(target=show_fermentation_multidisplay,
-                                                       name='fermentation_multidisplay',
-                                                       args=(refresh_time, character_map))
-                t_ferm_multidisplay.start()
-                if DEBUG: cbpi.app.logger.info("NextionDisplay  - threads Thread multidisplay started")
+                cbpi_version = (get_version_fo(""))
+                display.submit(show_standby, ip, cbpi_version)
             pass
-
-        else:
-            cbpi_version = (get_version_fo(""))
-            show_standby(ip, cbpi_version, character_map)
-        pass
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2013-2017 Danilo Bargen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+
+import threading
+from contextlib import contextmanager
+
+from .compat import monotonic
+
+
+class BusArbiter(object):
+    """
+    Process-wide lock of one I²C bus (``/dev/i2c-N``), shared by the LCD and
+    other users of the bus such as sensor plugins. Use :func:`bus_arbiter`
+    to get the arbiter of a port.
+
+    Every user holds the bus for one transaction (or a few that belong
+    together) at a time. Bulk writers like the LCD split their transfers
+    into chunks that fit into ``max_hold``, so an urgent request never waits
+    longer than one chunk. Urgent requests are served before all other
+    waiting ones.
+
+    .. sourcecode:: python
+
+        >>> with bus_arbiter(1).hold(urgent=True):
+        ...     value = bus.read_word_data(0x48, 0)
+
+    The lock is reentrant, so a holder may call code that takes it again.
+
+    :param port: The I²C port number.
+    :type port: int
+    :param max_hold: The longest a bulk writer should hold the bus, in
+        seconds. Default: ``0.002``.
+    :type max_hold: float
+
+    """
+
+    def __init__(self, port, max_hold=0.002):
+        self.port = port
+        self.max_hold = max_hold
+        self._cond = threading.Condition(threading.Lock())
+        self._owner = None
+        self._count = 0
+        self._urgent_waiting = 0
+        self._acquired_at = 0.0
+        self._stats = {
+            'acquired': 0,  # Number of holds
+            'contended': 0,  # Holds that had to wait for the bus
+            'wait_time': 0.0,  # Total time spent waiting, in seconds
+            'max_wait': 0.0,
+            'urgent_acquired': 0,
+            'urgent_wait_time': 0.0,
+            'urgent_max_wait': 0.0,
+            'max_hold': 0.0,  # Longest hold seen, in seconds
+            'overruns': 0,  # Holds longer than ``max_hold``
+        }
+
+    def acquire(self, urgent=False):
+        """Wait until the bus is free and take it."""
+        me = threading.current_thread()
+        with self._cond:
+            if self._owner is me:
+                self._count += 1
+                return
+            start = monotonic()
+            contended = False
+            if urgent:
+                self._urgent_waiting += 1
+            try:
+                while self._owner is not None or (not urgent and self._urgent_waiting):
+                    contended = True
+                    self._cond.wait()
+            finally:
+                if urgent:
+                    self._urgent_waiting -= 1
+            self._owner = me
+            self._count = 1
+            self._acquired_at = monotonic()
+            waited = self._acquired_at - start
+            stats = self._stats
+            stats['acquired'] += 1
+            if contended:
+                stats['contended'] += 1
+                stats['wait_time'] += waited
+                stats['max_wait'] = max(stats['max_wait'], waited)
+            if urgent:
+                stats['urgent_acquired'] += 1
+                stats['urgent_wait_time'] += waited
+                stats['urgent_max_wait'] = max(stats['urgent_max_wait'], waited)
+
+    def release(self):
+        """Give the bus back."""
+        with self._cond:
+            if self._owner is not threading.current_thread():
+                raise RuntimeError('Cannot release a bus that is not held.')
+            self._count -= 1
+            if self._count:
+                return
+            held = monotonic() - self._acquired_at
+            stats = self._stats
+            stats['max_hold'] = max(stats['max_hold'], held)
+            if held > self.max_hold:
+                stats['overruns'] += 1
+            self._owner = None
+            self._cond.notify_all()
+
+    @contextmanager
+    def hold(self, urgent=False):
+        """Context manager that holds the bus for the block.
+
+        :param urgent: Take the bus before all non-urgent waiters. Use this
+            for time critical reads. Default: ``False``.
+        :type urgent: bool
+
+        """
+        self.acquire(urgent)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def stats(self):
+        """Return a copy of the wait time statistics, times are in seconds."""
+        with self._cond:
+            return dict(self._stats)
+
+
+class ArbitratedBus(object):
+    """
+    Wrapper for an ``smbus.SMBus`` like object (or :class:`~.i2c.I2CDev`)
+    that holds the arbiter for every call.
+    """
+
+    def __init__(self, bus, arbiter):
+        self.bus = bus
+        self.arbiter = arbiter
+
+    def __getattr__(self, name):
+        func = getattr(self.bus, name)
+        if not callable(func) or name == 'close':
+            return func
+
+        def call(*args, **kwargs):
+            with self.arbiter.hold():
+                return func(*args, **kwargs)
+        return call
+
+
+_arbiters = {}
+_arbiters_lock = threading.Lock()
+
+
+def bus_arbiter(port, max_hold=None):
+    """Return the arbiter of I²C port ``port``, created on first use.
+
+    :param port: The I²C port number.
+    :type port: int
+    :param max_hold: The longest a bulk writer should hold the bus, in
+        seconds. Users of the port may ask for different times, the shortest
+        one is kept. Default: ``None`` (``0.002`` for a new arbiter).
+    :type max_hold: float
+
+    """
+    with _arbiters_lock:
+        if port not in _arbiters:
+            _arbiters[port] = BusArbiter(port)
+            if max_hold is not None:
+                _arbiters[port].max_hold = max_hold
+        elif max_hold is not None:
+            _arbiters[port].max_hold = min(_arbiters[port].max_hold, max_hold)
+        return _arbiters[port]
@@ -0,0 +1,320 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark of the LCD driver and the add-on screens, on the emulated LCD.
+
+    python benchmark.py [--iterations 50] [--rounds 5] [--output benchmark.json] [--compare baseline.json]
+
+Measures bus transactions, bytes on the wire, SMBus calls (syscalls on a
+Raspberry Pi), the Python time per operation (sleeps don't count, the clock
+is virtual) and the time the LCD would be busy, for the driver operations
+and for full renders of the screens against a mocked CraftBeerPi. Results
+are printed as a table and stored as JSON. With ``--compare`` the table
+shows the change against an earlier result file.
+"""
+
+import os
+import sys
+
+# This directory is a package, don't let its modules (enum.py) shadow the standard library
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path = [path for path in sys.path if os.path.abspath(path or os.curdir) != HERE]
+
+import argparse
+import importlib
+import json
+import logging
+import platform
+import time
+import types
+
+timer = getattr(time, 'perf_counter', time.time)
+
+PACKAGE = os.path.basename(HERE)
+# Fixed point in time for the screens (2020-03-20 12:00:00 UTC)
+NOW = 1584705600.0
+
+
+class Obj(object):
+    def __init__(self, **kwargs):
+        self.__dict__.update(kwargs)
+
+
+class MockCbpi(object):
+    """The parts of the CraftBeerPi 3 API used by the add-on, with a brewery
+    of two kettles, a running mash step and two fermenters."""
+
+    def __init__(self):
+        self.app = Obj(logger=logging.getLogger('benchmark'), route=lambda rule, **options: lambda func: func)
+        self.params = {'unit': 'C', 'brewery_name': 'Brauerei Ärger'}
+        self.cache = {
+            'active_step': Obj(name='Maischen Übung', timer_end=NOW + 3725),
+            'kettle': {1: Obj(id=1, name='Läuterbottich', sensor=1, heater=1, target_temp=72.0),
+                       2: Obj(id=2, name='Sudpfanne', sensor=2, heater=2, target_temp=99.5)},
+            'fermenter': {1: Obj(id=1, name='Gärtank 1', brewname='Weißbier', sensor=3, heater=3, cooler=4,
+                                 target_temp=18.0),
+                          2: Obj(id=2, name='Gärtank 2', brewname='Pils', sensor=4, heater=None, cooler=5,
+                                 target_temp=9.0)},
+            'fermenter_task': {1: Obj(fermenter_id=1, timer_start=NOW + 3 * 86400 + 5000, state='A'),
+                               2: Obj(fermenter_id=2, timer_start=None, state='I')},
+            'actors': {1: Obj(state=1), 2: Obj(state=0), 3: Obj(state=0), 4: Obj(state=1), 5: Obj(state=0)},
+        }
+        self.sensors = {1: 71.25, 2: 98.0, 3: 18.4, 4: 9.1}
+
+    def get_config_parameter(self, key, default):
+        return self.params.get(key, default)
+
+    def add_config_parameter(self, key, value, type, description, options=None):
+        self.params[key] = value
+
+    def get_sensor_value(self, sensor):
+        return self.sensors.get(int(sensor))
+
+    def notify(self, *args, **kwargs):
+        pass
+
+    def initalizer(self, order=0):
+        return lambda func: func
+
+    def backgroundtask(self, key, interval):
+        return lambda func: func
+
+
+class FrozenTime(object):
+    """Stand-in for the ``time`` module of the add-on, so the screens show
+    the same text on every run."""
+
+    gmtime = staticmethod(time.gmtime)
+    strftime = staticmethod(time.strftime)
+
+    def time(self):
+        return NOW
+
+    def localtime(self, seconds=None):
+        return time.gmtime(NOW if seconds is None else seconds)
+
+    def sleep(self, seconds):
+        pass
+
+
+def load_plugin():
+    """Import the add-on with the mocked CraftBeerPi."""
+    cbpi = MockCbpi()
+    modules = types.ModuleType('modules')
+    modules.cbpi = cbpi
+    modules.app = cbpi.app
+    sys.modules['modules'] = modules
+    package = types.ModuleType(PACKAGE)
+    package.__path__ = [HERE]
+    package.__file__ = os.path.join(HERE, '__init__.py')
+    package.__package__ = PACKAGE
+    sys.modules[PACKAGE] = package
+    with open(package.__file__, 'rb') as f:
+        exec(compile(f.read(), package.__file__, 'exec'), package.__dict__)
+    frozen = FrozenTime()
+    package.time = frozen
+    package.strftime = lambda fmt, t=None: time.strftime(fmt, frozen.localtime() if t is None else t)
+    package.lcd_unit = cbpi.params['unit']
+    return package
+
+
+class Bench(object):
+    """Runs the measurements on the emulated buses."""
+
+    def __init__(self, plugin, iterations, rounds):
+        self.plugin = plugin
+        self.iterations = iterations
+        self.rounds = rounds
+        self.emulator = importlib.import_module(PACKAGE + '.emulator')
+        self.i2c = importlib.import_module(PACKAGE + '.i2c')
+        self.clock = self.emulator.VirtualClock()
+        self.bus = self.emulator.Bus(port=1, bus_clock=100000, clock=self.clock)
+        self.i2c.SMBus = self.emulator.SMBus
+        self.i2c.I2CDev = self.emulator.SMBus
+        self.gpio = None
+        self.results = {}
+
+    def attach(self, expander, address, gpio_bank='A'):
+        hd = self.emulator.HD44780(20, 4)
+        if expander == 'PCF8574':
+            self.bus.attach(address, self.emulator.PCF8574(hd))
+        else:
+            self.bus.attach(address, self.emulator.MCP230XX(hd, expander, gpio_bank))
+        return hd
+
+    def measure(self, name, func, count):
+        """Run ``func`` ``count`` times per round and store the averages. The
+        Python time is the one of the fastest round."""
+        bus, gpio = self.bus, self.gpio
+        calls, nbytes, transactions = bus.calls, bus.bytes, len(bus.log)
+        gpio_calls = gpio.calls if gpio is not None else 0
+        virtual = self.clock()
+        cpu = None
+        for round in range(self.rounds):
+            start = timer()
+            for i in range(count):
+                func(i)
+            elapsed = timer() - start
+            cpu = elapsed if cpu is None else min(cpu, elapsed)
+        total = float(count * self.rounds)
+        result = {
+            'transactions': (len(bus.log) - transactions) / total,
+            'bytes': (bus.bytes - nbytes) / total,
+            'syscalls': (bus.calls - calls + (gpio.calls - gpio_calls if gpio is not None else 0)) / total,
+            'cpu_us': cpu * 1e6 / count,
+            'lcd_us': (self.clock() - virtual) * 1e6 / total,
+        }
+        self.results[name] = result
+        return result
+
+    def check(self, name, hd):
+        if hd.violations:
+            logging.warning('%s: %d timing violations, first: %s', name, len(hd.violations), hd.violations[0][1])
+
+    # Driver operations
+
+    def driver_configs(self):
+        i2c = self.i2c
+        return [
+            ('pcf8574', 0x27, 'PCF8574', lambda: i2c.CharLCD('PCF8574', 0x27, charmap='A00')),
+            ('pcf8574-batched', 0x27, 'PCF8574', lambda: i2c.CharLCD(
+                'PCF8574', 0x27, charmap='A00', batched=True, transport='i2c-dev', nibble_encoding='minimal',
+                bus_clock=100000, busy_flag_polling=True)),
+            ('mcp23017', 0x20, 'MCP23017', lambda: i2c.CharLCD(
+                'MCP23017', 0x20, expander_params={'gpio_bank': 'A'}, charmap='A00')),
+            ('mcp23017-batched', 0x20, 'MCP23017', lambda: i2c.CharLCD(
+                'MCP23017', 0x20, expander_params={'gpio_bank': 'A'}, charmap='A00', batched=True)),
+            ('gpio', None, 'GPIO', self.gpio_lcd),
+            ('gpio-40x4', None, 'GPIO', lambda: self.gpio_lcd(cols=40, pin_e2=13)),
+        ]
+
+    def gpio_lcd(self, **kwargs):
+        self.gpio.install()
+        gpio = importlib.import_module(PACKAGE + '.gpio')
+        gpio.GPIO = self.gpio
+        return gpio.CharLCD(pin_rs=15, pin_e=16, pins_data=[21, 22, 23, 24], numbering_mode=self.gpio.BOARD,
+                            charmap='A00', **kwargs)
+
+    def run_driver(self):
+        texts = ['Maischen 65.0 C  1/4', 'Laeutern 78.0 C  2/4']
+        bitmaps = [[0b11100, 0, 0b11100, 0b11111, 0b11101, 0b11101, 0b11111, 0b11100],
+                   [0b00100, 0b10101, 0b01110, 0b11111, 0b01110, 0b10101, 0b00100, 0]]
+        positions = [(1, 5), (3, 12)]
+        for config, address, expander, factory in self.driver_configs():
+            hd2 = None
+            if config == 'gpio-40x4':
+                # Two controllers with 2 lines each
+                hd, hd2 = self.emulator.HD44780(40, 2), self.emulator.HD44780(40, 2)
+                self.gpio = self.emulator.GPIO(hd, 15, 16, [21, 22, 23, 24], clock=self.clock,
+                                               lcd2=hd2, pin_e2=13)
+            elif expander == 'GPIO':
+                hd = self.emulator.HD44780(20, 4)
+                self.gpio = self.emulator.GPIO(hd, 15, 16, [21, 22, 23, 24], clock=self.clock)
+            else:
+                hd = self.attach(expander, address)
+                self.gpio = None
+            lcd = factory()
+            cols, rows = lcd.lcd.cols, lcd.lcd.rows
+            frames = [[(text * 2)[:cols] for text in texts * 2],
+                      [(text * 3)[7:7 + cols] for text in texts[::-1] * 2]]
+
+            def write_string(i):
+                lcd.cursor_pos = (0, 0)
+                lcd.write_string(texts[i % 2])
+            self.measure('%s/write_string' % config, write_string, self.iterations)
+            self.measure('%s/clear' % config, lambda i: lcd.clear(), self.iterations)
+            self.measure('%s/create_char' % config, lambda i: lcd.create_char(i % 8, bitmaps[i // 8 % 2]),
+                         self.iterations)
+
+            def cursor_pos(i):
+                lcd.cursor_pos = positions[i % 2]
+            self.measure('%s/cursor_pos' % config, cursor_pos, self.iterations)
+
+            def render(i):
+                # Almost every cell changes
+                lcd.render(frames[i % 2][:rows])
+            self.measure('%s/render' % config, render, self.iterations)
+            self.check(config, hd)
+            if hd2 is not None:
+                self.check(config, hd2)
+            lcd.close()
+
+    # Screens
+
+    def run_screens(self):
+        plugin = self.plugin
+        self.gpio = None
+        for spec in ['0x27@1 20x4 A00 PCF8574', '0x20@1 20x4 A00 MCP23017:A']:
+            config = plugin.parse_displays(spec)[0]
+            hd = self.attach(config.expander, config.address, config.gpio_bank)
+            display = plugin.DisplayRegistry().add(config)
+            display.open()
+            for name, bitmap in plugin.lcd_glyphs.items():
+                display.glyphs.register(name, bitmap)
+            draw = display.draw
+
+            def draw_and_flush(*args, **kwargs):
+                # Every page of a screen is sent completely, like with a refresh delay
+                draw(*args, **kwargs)
+                for lcd in display.lcds:
+                    lcd.flush()
+            display.draw = draw_and_flush
+            name = '%s-display' % config.expander.lower()
+            screens = [
+                ('show_multidisplay', lambda i: plugin.show_multidisplay(display, 0)),
+                ('show_singlemode', lambda i: plugin.show_singlemode(display, 1, bool(i % 2))),
+                ('show_fermentation_multidisplay', lambda i: plugin.show_fermentation_multidisplay(display, 0)),
+                ('show_standby', lambda i: plugin.show_standby(display, '192.168.0.10', '3.0.2')),
+            ]
+            for screen, func in screens:
+                self.measure('%s/%s' % (name, screen), func, max(1, self.iterations // 5))
+            self.check(name, hd)
+            display.close()
+
+
+def print_table(results, baseline=None):
+    columns = ['transactions', 'bytes', 'syscalls', 'cpu_us', 'lcd_us']
+    header = '%-48s' % 'benchmark' + ''.join('%16s' % column for column in columns)
+    print(header)
+    print('-' * len(header))
+    for name in sorted(results):
+        cells = []
+        for column in columns:
+            value = results[name][column]
+            cell = '%.1f' % value
+            if baseline is not None and name in baseline and baseline[name][column]:
+                cell += ' %+4.0f%%' % ((value / baseline[name][column] - 1) * 100)
+            cells.append('%16s' % cell)
+        print('%-48s' % name + ''.join(cells))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the LCD driver and screens on the emulated LCD.')
+    parser.add_argument('--iterations', type=int, default=50, help='Operations per driver benchmark')
+    parser.add_argument('--rounds', type=int, default=5, help='Rounds per benchmark, the fastest one counts')
+    parser.add_argument('--output', default='benchmark.json', help='Where to store the results')
+    parser.add_argument('--compare', help='Earlier result file to compare with')
+    args = parser.parse_args()
+
+    plugin = load_plugin()
+    bench = Bench(plugin, args.iterations, args.rounds)
+    uninstall = bench.clock.install()
+    try:
+        bench.run_driver()
+        bench.run_screens()
+    finally:
+        uninstall()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)['results']
+    print_table(bench.results, baseline)
+    with open(args.output, 'w') as f:
+        json.dump({'python': platform.python_version(), 'iterations': args.iterations,
+                   'rounds': args.rounds,
+                   'results': bench.results}, f, indent=2, sort_keys=True)
+
+
+if __name__ == '__main__':
+    main()
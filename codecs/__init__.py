@@ -66,6 +66,32 @@ class Codec(object):
 
         return result
 
+    def encode_runs(self, input_):  # type: (str) -> List[Union[bytearray, int]]
+        """Like ``encode()``, but split into runs, see ``split_runs()``."""
+        return split_runs(self.encode(input_))
+
+    def encode_line(self, input_):  # type: (str) -> bytearray
+        """Encode a single line. CR and LF characters are dropped."""
+        return bytearray(code for code in self.encode(input_) if code >= 0)
+
+
+def split_runs(encoded):  # type: (List[int]) -> List[Union[bytearray, int]]
+    """
+    Split character codes as returned by ``Codec.encode()`` into bytearrays
+    of regular characters and the ``CR`` and ``LF`` constants between them.
+    """
+    result = []
+    start = 0
+    for i, code in enumerate(encoded):
+        if code < 0:
+            if i > start:
+                result.append(bytearray(encoded[start:i]))
+            result.append(code)
+            start = i + 1
+    if start < len(encoded):
+        result.append(bytearray(encoded[start:]))
+    return result
+
 
 class A00Codec(Codec):
     def __init__(self):
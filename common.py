@@ -25,6 +25,8 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 import itertools
 import time
 
+from .compat import monotonic
+
 
 # # # BIT PATTERNS # # #
 
@@ -74,6 +76,10 @@ LCD_5x8DOTS = 0x00
 RS_INSTRUCTION = 0x00
 RS_DATA = 0x01
 
+# Execution times in microseconds (HD44780 datasheet, fosc = 270 kHz)
+EXEC_TIME = 41  # Most instructions and data writes (37us + 4us address update)
+EXEC_TIME_LONG = 1520  # LCD_CLEARDISPLAY and LCD_RETURNHOME
+
 
 # # # Helper classes # # #
 
@@ -93,6 +99,105 @@ class CursorMode(object):
     blink = LCD_CURSOROFF | LCD_BLINKON
 
 
+class Pacer(object):
+    """
+    Bus-timing-aware replacement for fixed ``usleep`` calls.
+
+    The pacer keeps a projection of when the bytes handed to the bus finish
+    on the wire and when the LCD is ready for the next enable edge. A wait
+    is only needed for the part of an execution time that the bus transfer
+    in between does not already cover. Bytes are assumed to be sent back to
+    back, start/stop conditions and address bytes are not counted, so the
+    projection errs on the safe side.
+
+    The driver reports bytes with ``queued()`` (buffered, not on the wire
+    yet) or ``sent()`` (the write call has returned), calls ``flushed()``
+    once a buffer went out, and ``settle()`` after each latched instruction.
+
+    LCDs with two controllers are ready independently of each other, the
+    ``target`` arguments are bit masks of the controllers (bit 0 is the
+    first one).
+
+    :param bus_clock: The I2C bus clock in Hz.
+    :type bus_clock: int
+    :param margin: Safety factor applied to all execution times.
+    :type margin: float
+    :param targets: Number of controllers. Default: ``1``.
+    :type targets: int
+
+    """
+    def __init__(self, bus_clock, margin=1.5, targets=1):
+        self.bus_clock = bus_clock
+        self.margin = margin
+        self.byte_time = 9.0 / bus_clock  # 8 data bits plus ACK
+        self._clock = 0.0  # Projected time at which the last byte is on the wire
+        self._ready = [0.0] * targets  # Projected time at which each controller is ready again
+        self._unsent = 0  # Bytes queued since the last flush
+        self._ready_unsent = [False] * targets  # Whether _ready depends on unsent bytes
+
+    def queued(self, nbytes=1):
+        """Account for ``nbytes`` that were added to a transmit buffer."""
+        if self._unsent == 0:
+            # The bus was idle, the buffer won't start before now
+            self._clock = max(self._clock, monotonic())
+        self._clock += nbytes * self.byte_time
+        self._unsent += nbytes
+
+    def flushed(self):
+        """All queued bytes are on the wire now."""
+        now = monotonic()
+        if now > self._clock:
+            for target, unsent in enumerate(self._ready_unsent):
+                if unsent:
+                    self._ready[target] += now - self._clock
+            self._clock = now
+        self._unsent = 0
+        self._ready_unsent = [False] * len(self._ready)
+
+    def sent(self, nbytes=1):
+        """Account for ``nbytes`` that were written synchronously."""
+        self.queued(nbytes)
+        self.flushed()
+
+    def settle(self, microseconds, target=1):
+        """The LCD needs ``microseconds`` after the last byte before the next edge."""
+        ready = self._clock + microseconds * self.margin / 1000000.0
+        unsent = self._unsent > 0
+        if target == 1:
+            # The common case of one controller
+            if ready > self._ready[0]:
+                self._ready[0] = ready
+            self._ready_unsent[0] = unsent
+            return
+        for i in range(len(self._ready)):
+            if target >> i & 1:
+                self._ready[i] = max(self._ready[i], ready)
+                self._ready_unsent[i] = unsent
+
+    def ready(self):
+        """The LCD reported that it is ready (e.g. via the busy flag)."""
+        self._ready = [0.0] * len(self._ready)
+        self._ready_unsent = [False] * len(self._ready)
+
+    def remaining(self, nbytes=0, target=1):
+        """
+        Seconds that still have to pass before sending ``nbytes`` more bytes,
+        the last of which causes an enable edge.
+        """
+        start = self._clock if self._unsent else max(self._clock, monotonic())
+        if target == 1:
+            return self._ready[0] - (start + nbytes * self.byte_time)
+        ready = max(t for i, t in enumerate(self._ready) if target >> i & 1)
+        return ready - (start + nbytes * self.byte_time)
+
+    def sleep(self, seconds):
+        """Sleep, the bus is idle meanwhile. The driver counts the time in
+        its ``sleep_time`` stat."""
+        time.sleep(seconds)
+        if not self._unsent:
+            self._clock = max(self._clock, monotonic())
+
+
 # # # HELPER FUNCTIONS # # #
 
 def msleep(milliseconds):
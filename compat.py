@@ -29,3 +29,8 @@ try:
     range = xrange
 except NameError:
     range = range
+
+try:
+    from time import monotonic
+except ImportError:
+    from time import time as monotonic
@@ -0,0 +1,417 @@
+# -*- coding: utf-8 -*-
+
+import re
+import logging
+import threading
+from collections import namedtuple
+
+from .compat import monotonic
+from .glyphs import GlyphManager
+from .i2c import CharLCD
+from .marquee import Marquee
+
+# One LCD of the add-on. ``kettle`` is the kettle id the display shows in single
+# mode while a brewing step is running, or None to follow LCD_Multidisplay.
+# ``mirrors`` are the names (address@port) of further LCDs that show the same content.
+# ``batched`` is True, False or None for the default of the expander (see ``open_lcd``),
+# ``transport`` the I2C transport of ``i2c.CharLCD``. ``e2`` is the pin of the control bank
+# that drives the E line of the second controller of a 40x4 LCD.
+DisplayConfig = namedtuple('DisplayConfig',
+                           'name address port cols rows charmap expander gpio_bank kettle mirrors batched transport '
+                           'e2')
+DisplayConfig.__new__.__defaults__ = (None, 'i2c-dev', 0)
+
+ADDRESS_RE = re.compile(r'^(0x[0-9a-fA-F]+)(?:@(\d+))?$')
+GEOMETRY_RE = re.compile(r'^(\d+)x(\d+)$')
+EXPANDER_RE = re.compile(r'^(PCF8574|MCP23008|MCP23017)(?::(A|B|AB|BA))?$')
+KETTLE_RE = re.compile(r'^kettle=(\d+)$')
+MIRROR_RE = re.compile(r'^mirror=(0x[0-9a-fA-F]+(?:@\d+)?)$')
+BATCHED_RE = re.compile(r'^batched=(on|off)$')
+TRANSPORT_RE = re.compile(r'^transport=(i2c-dev|smbus)$')
+E2_RE = re.compile(r'^e2=(?:GP)?([0-7])$')
+
+
+def parse_displays(value, charmap='A00'):
+    """
+    Parse the LCD_Displays parameter into a list of DisplayConfig.
+
+    Displays are separated by ``;``. Each display is a list of words, only
+    the address is required:
+
+        0x27@1 20x4 A00 PCF8574 kettle=2 mirror=0x26@1
+
+    - address and I2C port (default port 1)
+    - columns x rows (default 20x4)
+    - character map A00 or A02 (default: the ``charmap`` argument)
+    - expander PCF8574, MCP23008 or MCP23017:<bank> (default PCF8574)
+    - kettle=<id> to show one kettle in single mode (default: follow LCD_Multidisplay)
+    - mirror=<address@port> for every further LCD of the same kind that shows the same content
+    - batched=on|off to send the expander bytes in block writes (default: on, except for one
+      bank of a MCP23017, where batched mode rewrites the other bank)
+    - transport=i2c-dev|smbus (default i2c-dev)
+    - e2=<pin> the pin (0-7) of the control bank for the E line of the second controller of a
+      40x4 LCD (default 0)
+    """
+    configs = []
+    for entry in value.split(';'):
+        words = entry.split()
+        if not words:
+            continue
+        match = ADDRESS_RE.match(words[0])
+        if match is None:
+            raise ValueError('LCD_Displays: "%s" does not start with an address like 0x27' % entry.strip())
+        address = int(match.group(1), 16)
+        port = int(match.group(2) or 1)
+        cols, rows = 20, 4
+        display_charmap = charmap
+        expander, gpio_bank = 'PCF8574', None
+        kettle = None
+        mirrors = []
+        batched, transport = None, 'i2c-dev'
+        e2 = None
+        for word in words[1:]:
+            if GEOMETRY_RE.match(word):
+                cols, rows = [int(x) for x in GEOMETRY_RE.match(word).groups()]
+            elif word in ['A00', 'A02']:
+                display_charmap = word
+            elif EXPANDER_RE.match(word):
+                expander, gpio_bank = EXPANDER_RE.match(word).groups()
+                if expander == 'MCP23017' and gpio_bank is None:
+                    gpio_bank = 'A'
+            elif KETTLE_RE.match(word):
+                kettle = int(KETTLE_RE.match(word).group(1))
+            elif MIRROR_RE.match(word):
+                mirrors.append(MIRROR_RE.match(word).group(1))
+            elif BATCHED_RE.match(word):
+                batched = BATCHED_RE.match(word).group(1) == 'on'
+            elif TRANSPORT_RE.match(word):
+                transport = TRANSPORT_RE.match(word).group(1)
+            elif E2_RE.match(word):
+                e2 = int(E2_RE.match(word).group(1))
+            else:
+                raise ValueError('LCD_Displays: unknown setting "%s" in "%s"' % (word, entry.strip()))
+        if (cols, rows) == (40, 4) and expander == 'PCF8574':
+            raise ValueError('LCD_Displays: a 40x4 LCD needs a MCP23008 or MCP23017, the PCF8574 has no pin '
+                             'for the E line of its second controller, in "%s"' % entry.strip())
+        if e2 is not None and (cols, rows) != (40, 4):
+            raise ValueError('LCD_Displays: e2= is only used by 40x4 LCDs, in "%s"' % entry.strip())
+        configs.append(DisplayConfig(name=words[0], address=address, port=port, cols=cols, rows=rows,
+                                     charmap=display_charmap, expander=expander, gpio_bank=gpio_bank,
+                                     kettle=kettle, mirrors=tuple(mirrors), batched=batched,
+                                     transport=transport, e2=0 if e2 is None else e2))
+    return configs
+
+
+def open_lcd(config):
+    """Create the CharLCD of a display."""
+    # No busy flag polling, at 100 kHz a read takes about as long as a clear
+    nibble_encoding = 'minimal' if config.expander == 'PCF8574' else 'classic'
+    expander_params = {'gpio_bank': config.gpio_bank} if config.expander == 'MCP23017' else {}
+    batched = config.batched
+    if batched is None:
+        # On one bank of the MCP23017, batched mode rewrites the other bank with the value it had
+        # at start, which would undo the changes of other plugins that use it (e.g. relays)
+        batched = config.expander != 'MCP23017' or len(config.gpio_bank) == 2
+    if config.expander != 'PCF8574' and (config.cols, config.rows) == (40, 4):
+        # 40x4 LCDs have two controllers, the E line of the second one is on another pin
+        expander_params['pin_e2'] = config.e2
+    return CharLCD(i2c_expander=config.expander, address=config.address, expander_params=expander_params,
+                   port=config.port, cols=config.cols, rows=config.rows, dotsize=8,
+                   charmap=config.charmap,
+                   auto_linebreaks=True, backlight_enabled=True, batched=batched,
+                   transport=config.transport, nibble_encoding=nibble_encoding, bus_clock=100000,
+                   write_behind=True, bus_arbiter=True)
+
+
+def mirror_config(config, name):
+    """The DisplayConfig of a mirror of ``config``."""
+    match = ADDRESS_RE.match(name)
+    return config._replace(name=name, address=int(match.group(1), 16), port=int(match.group(2) or 1),
+                           kettle=None, mirrors=())
+
+
+class Display(object):
+    """
+    One LCD, or a group of mirrored LCDs, with its own render worker thread.
+
+    Screens are rendered with ``submit()``: the worker calls the job with the
+    display, so a job that takes long (e.g. cycling through all kettles) only
+    delays this display and never the lcdjob background task or the other
+    displays. A job formats its lines once and hands them to ``draw()``,
+    which encodes them once and writes them to every LCD of the group. Each
+    LCD only sends the cells that differ from its own content.
+
+    Fields with text that is too long for them scroll on a timer thread of
+    their own, see ``draw()``, so they keep moving while a job waits between
+    two pages.
+    """
+
+    # Seconds between two steps of the scrolling fields
+    scroll_interval = 0.5
+
+    def __init__(self, config, logger=None):
+        self.config = config
+        self.lcd = None
+        self.lcds = []  # self.lcd and its mirrors
+        self.lcd_names = []  # address@port of each of self.lcds
+        self.glyphs = None  # GlyphManager of the CGRAM of self.lcds
+        self.blink = False  # state of the blinking beerglass in single mode
+        self._logger = logger or logging.getLogger(__name__)
+        self._cond = threading.Condition()
+        self._job = None
+        self._busy = False
+        self._closed = False
+        self._renders = {}  # job name -> [count, total seconds, max seconds, last seconds]
+        self._thread = threading.Thread(target=self._run, name='lcd-render-%s' % config.name)
+        self._thread.daemon = True
+        self._marquees = []  # Scrolling fields of the current page
+        self._draw_lock = threading.Lock()  # Serializes pages and scroll steps
+        self._stopped = threading.Event()
+        self._scroller = threading.Thread(target=self._scroll, name='lcd-marquee-%s' % config.name)
+        self._scroller.daemon = True
+
+    def open(self):
+        """Connect the LCDs and start the render worker."""
+        self.lcd = open_lcd(self.config)
+        self.lcds = [self.lcd]
+        self.lcd_names = [self.config.name]
+        for name in self.config.mirrors:
+            try:
+                self.lcds.append(open_lcd(mirror_config(self.config, name)))
+                self.lcd_names.append(name)
+            except Exception:
+                self._logger.exception('LCDDisplay  - mirror %s of display %s failed' % (name, self.config.name))
+        self.glyphs = GlyphManager(self.lcds)
+        self._thread.start()
+        self._scroller.start()
+
+    def glyph(self, name, fallback=None):
+        """The character that shows the glyph ``name`` (see ``glyphs``), or
+        ``fallback`` if all CGRAM locations are in use on the screen."""
+        return self.glyphs.char(name, fallback)
+
+    def draw(self, lines, symbol=None, scroll=(), flip=False):
+        """
+        Show ``lines``, cut or padded to the size of the display. The
+        ``symbol`` goes to the end of the first line. Each LCD gets the screen
+        as one frame, see :meth:`~.lcd.BaseCharLCD.frame`. The frame starts
+        blank, so a page overwrites the previous one without clearing the LCD
+        and only the cells that differ are sent. The glyphs handed out by
+        ``glyph()`` since the previous page can be replaced afterwards, unless
+        they are still visible or part of a scrolling field.
+
+        ``scroll`` is a list of (row, col, width, text) fields that are shown
+        as a :class:`~.marquee.Marquee` on top of the lines. Text longer than
+        its field scrolls every ``scroll_interval`` seconds, only the cells
+        of the field are sent then. A field that the previous page had with
+        the same text keeps scrolling where it is.
+
+        With ``flip`` the page is written to the hidden DDRAM columns of LCDs
+        with 2 rows and then shown at once, see ``frame(flip=True)`` of the
+        LCD. Meant for page changes, the other LCDs ignore it.
+        """
+        cols, rows = self.config.cols, self.config.rows
+        codec = self.lcd.codec
+        encoded = [codec.encode_line(line[:cols]) for line in lines[:rows]]
+        if symbol is not None:
+            symbol = codec.encode_line(symbol)
+        with self._draw_lock:
+            current = dict(((m.row, m.col, m.width, bytes(m.text)), m) for m in self._marquees)
+            marquees = []
+            for row, col, width, text in scroll:
+                if row >= rows or col >= cols:
+                    continue
+                width = min(width, cols - col)
+                text = codec.encode_line(text)
+                marquee = current.get((row, col, width, bytes(text)))
+                marquees.append(marquee or Marquee(row, col, width, text))
+            for lcd in self.lcds:
+                with lcd.frame(flip and lcd.pages > 1) as frame:
+                    frame.clear()
+                    for row, line in enumerate(encoded):
+                        frame.write_encoded(row, 0, line)
+                    for marquee in marquees:
+                        marquee.write(frame)
+                    if symbol is not None:
+                        frame.write_encoded(0, cols - 1, symbol)
+            self._marquees = [marquee for marquee in marquees if marquee.scrolling]
+            self.glyphs.release(code for marquee in self._marquees for code in marquee.text)
+
+    def submit(self, job, *args):
+        """
+        Run job(display, *args) on the render worker, unless it is still busy
+        with the previous job. Returns whether the job was accepted.
+        """
+        with self._cond:
+            if self._closed or self._busy or self._job is not None:
+                return False
+            self._job = (job, args)
+            self._cond.notify()
+            return True
+
+    def render_stats(self):
+        """Return {job name: (count, total, max, last)} of the render
+        durations, in seconds."""
+        with self._cond:
+            return dict((name, tuple(values)) for name, values in self._renders.items())
+
+    @property
+    def busy(self):
+        with self._cond:
+            return self._busy or self._job is not None
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        self._stopped.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if self._scroller.is_alive():
+            self._scroller.join()
+        for lcd in self.lcds:
+            lcd.close()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._job is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                job, args = self._job
+                self._job = None
+                self._busy = True
+            start = monotonic()
+            try:
+                job(self, *args)
+            except Exception:
+                self._logger.exception('LCDDisplay  - display %s: %s failed' % (self.config.name, job.__name__))
+            finally:
+                duration = monotonic() - start
+                with self._cond:
+                    self._busy = False
+                    values = self._renders.setdefault(job.__name__, [0, 0.0, 0.0, 0.0])
+                    values[0] += 1
+                    values[1] += duration
+                    values[2] = max(values[2], duration)
+                    values[3] = duration
+
+    def _scroll(self):
+        while not self._stopped.wait(self.scroll_interval):
+            with self._draw_lock:
+                if not self._marquees:
+                    continue
+                try:
+                    for marquee in self._marquees:
+                        marquee.step()
+                    for lcd in self.lcds:
+                        with lcd.frame() as frame:
+                            for marquee in self._marquees:
+                                marquee.write(frame)
+                except Exception:
+                    self._logger.exception('LCDDisplay  - display %s: scrolling failed' % self.config.name)
+
+
+class DisplayRegistry(object):
+    """All LCDs of the add-on, in configuration order."""
+
+    def __init__(self, logger=None):
+        self._logger = logger
+        self._displays = []
+
+    def add(self, config):
+        """Register a display. Call ``open()`` on the result to connect it."""
+        display = Display(config, self._logger)
+        self._displays.append(display)
+        return display
+
+    def __iter__(self):
+        return iter(list(self._displays))
+
+    def __len__(self):
+        return len(self._displays)
+
+    def close(self):
+        for display in self._displays:
+            display.close()
+
+
+# (stats key, metric name, type, help) of the BaseCharLCD counters
+LCD_METRICS = [
+    ('instructions', 'lcddisplay_instructions_total', 'counter', 'Instructions sent to the LCD.'),
+    ('data_bytes', 'lcddisplay_data_bytes_total', 'counter', 'Characters and CGRAM bytes sent to the LCD.'),
+    ('bus_writes', 'lcddisplay_bus_writes_total', 'counter', 'I2C write transactions.'),
+    ('bus_reads', 'lcddisplay_bus_reads_total', 'counter', 'I2C read transactions (busy flag polls).'),
+    ('cells_skipped', 'lcddisplay_cells_skipped_total', 'counter', 'Writes skipped because the cell was unchanged.'),
+    ('rows_skipped', 'lcddisplay_rows_skipped_total', 'counter', 'Rows skipped because the whole row was unchanged.'),
+    ('cursor_moves', 'lcddisplay_cursor_moves_total', 'counter', 'Set DDRAM address instructions.'),
+    ('sleep_time', 'lcddisplay_sleep_seconds_total', 'counter', 'Time the driver slept.'),
+    ('transmit_time', 'lcddisplay_transmit_seconds_total', 'counter', 'Time the driver spent in bus calls.'),
+]
+
+# Statistics of the bus arbiters (``BusArbiter.stats()``), per I2C port
+ARBITER_METRICS = [
+    ('acquired', 'lcddisplay_bus_holds_total', 'counter', 'Holds of the I2C bus by any of its users.'),
+    ('contended', 'lcddisplay_bus_contended_total', 'counter', 'Holds that had to wait for the bus.'),
+    ('wait_time', 'lcddisplay_bus_wait_seconds_total', 'counter', 'Time spent waiting for the bus.'),
+    ('max_wait', 'lcddisplay_bus_wait_seconds_max', 'gauge', 'Longest wait for the bus.'),
+    ('urgent_acquired', 'lcddisplay_bus_urgent_holds_total', 'counter', 'Urgent holds of the bus.'),
+    ('urgent_wait_time', 'lcddisplay_bus_urgent_wait_seconds_total', 'counter',
+     'Time spent waiting for the bus by urgent holds.'),
+    ('urgent_max_wait', 'lcddisplay_bus_urgent_wait_seconds_max', 'gauge', 'Longest wait of an urgent hold.'),
+    ('max_hold', 'lcddisplay_bus_hold_seconds_max', 'gauge', 'Longest hold of the bus.'),
+    ('overruns', 'lcddisplay_bus_overruns_total', 'counter', 'Holds longer than the hold limit.'),
+]
+
+
+def _labels(**labels):
+    return ','.join('%s="%s"' % (key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+                    for key, value in sorted(labels.items()))
+
+
+def prometheus_metrics(displays):
+    """The counters of all LCDs, the render durations of all displays and the
+    statistics of their bus arbiters, in the Prometheus text exposition
+    format."""
+    samples = dict((metric[1], []) for metric in LCD_METRICS + ARBITER_METRICS)
+    samples.update({'lcddisplay_queue_depth': [], 'lcddisplay_renders_total': [],
+                    'lcddisplay_render_seconds_total': [], 'lcddisplay_render_seconds_max': [],
+                    'lcddisplay_render_seconds_last': [], 'lcddisplay_bus_hold_limit_seconds': []})
+    arbiters = []
+    for display in displays:
+        for name, lcd in zip(display.lcd_names, display.lcds):
+            labels = _labels(display=display.config.name, lcd=name)
+            stats = lcd.stats()
+            for key, metric, _, _ in LCD_METRICS:
+                samples[metric].append((labels, stats[key]))
+            samples['lcddisplay_queue_depth'].append((labels, lcd.queue_depth))
+            if lcd.arbiter is not None and lcd.arbiter not in arbiters:
+                arbiters.append(lcd.arbiter)
+        for screen, (count, total, longest, last) in sorted(display.render_stats().items()):
+            labels = _labels(display=display.config.name, screen=screen)
+            samples['lcddisplay_renders_total'].append((labels, count))
+            samples['lcddisplay_render_seconds_total'].append((labels, total))
+            samples['lcddisplay_render_seconds_max'].append((labels, longest))
+            samples['lcddisplay_render_seconds_last'].append((labels, last))
+    for arbiter in arbiters:
+        labels = _labels(port=arbiter.port)
+        stats = arbiter.stats()
+        for key, metric, _, _ in ARBITER_METRICS:
+            samples[metric].append((labels, stats[key]))
+        samples['lcddisplay_bus_hold_limit_seconds'].append((labels, arbiter.max_hold))
+    metrics = [metric[1:] for metric in LCD_METRICS + ARBITER_METRICS] + [
+        ('lcddisplay_queue_depth', 'gauge', 'Writes queued for the I/O thread.'),
+        ('lcddisplay_renders_total', 'counter', 'Screens rendered.'),
+        ('lcddisplay_render_seconds_total', 'counter', 'Time spent rendering screens.'),
+        ('lcddisplay_render_seconds_max', 'gauge', 'Longest render of a screen.'),
+        ('lcddisplay_render_seconds_last', 'gauge', 'Duration of the last render of a screen.'),
+        ('lcddisplay_bus_hold_limit_seconds', 'gauge', 'The longest the LCD holds the bus at a time (max_hold).'),
+    ]
+    lines = []
+    for metric, kind, description in metrics:
+        lines.append('# HELP %s %s' % (metric, description))
+        lines.append('# TYPE %s %s' % (metric, kind))
+        for labels, value in samples[metric]:
+            lines.append('%s{%s} %s' % (metric, labels, repr(float(value)) if isinstance(value, float) else value))
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,718 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2013-2017 Danilo Bargen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+# Software model of an HD44780 LCD behind a PCF8574 or MCP230XX I²C expander,
+# or wired to the Raspberry Pi GPIOs. Used to test and benchmark the drivers
+# without hardware.
+#
+# .. sourcecode:: python
+#
+#     >>> from RPLCD import emulator
+#     >>> from RPLCD import i2c
+#     >>> bus = emulator.Bus(port=1)
+#     >>> hd = emulator.HD44780(cols=20, rows=4)
+#     >>> bus.attach(0x27, emulator.PCF8574(hd))
+#     >>> i2c.SMBus = emulator.SMBus
+#     >>> lcd = i2c.CharLCD('PCF8574', 0x27)
+#     >>> lcd.write_string('Hello')
+#     >>> hd.text()[0]
+#     'Hello               '
+#     >>> hd.violations
+#     []
+#
+# Every bus transaction and pin change is timestamped. The HD44780 checks the
+# timing constraints of its datasheet (busy time of the instructions, setup and
+# hold times around the E pulse) and records every violation in
+# ``HD44780.violations``. Use a :class:`VirtualClock` to make the time
+# deterministic and the tests fast.
+
+import errno
+import sys
+import time
+import types
+from collections import namedtuple
+
+from . import common as c
+from .compat import monotonic, range
+
+
+# Timing of the HD44780 (at 270 kHz), in seconds
+EXEC_TIME = 37e-6
+EXEC_TIME_LONG = 1.52e-3
+# The first function set instructions after power on take longer, see
+# Hitachi manual page 45
+INIT_TIMES = (4.1e-3, 100e-6)
+T_AS = 40e-9  # RS and RW setup time before E rises
+T_PW = 230e-9  # E pulse width
+T_DSW = 80e-9  # Data setup time before E falls
+
+# PCF8574 pins, see i2c.py
+PCF8574_RS = 0x01
+PCF8574_RW = 0x02
+PCF8574_E = 0x04
+PCF8574_BACKLIGHT = 0x08
+
+# MCP230XX pins and registers, see i2c.py
+MCP230XX_RS = 0x02
+MCP230XX_E = 0x04
+MCP230XX_DATASHIFT = 3
+MCP230XX_BACKLIGHT = 0x80
+MCP230XX_IOCON_SEQOP = 0x20
+
+SMBUS_BLOCK_MAX = 32
+
+# One bus transaction: start and end time, address, kind ('write' or
+# 'read') and the bytes after the address byte.
+Transaction = namedtuple('Transaction', 'start end address kind data')
+
+
+class VirtualClock(object):
+    """
+    Deterministic time for the emulator. Calling the clock returns the
+    current time in seconds, ``sleep()`` advances it.
+
+    ``install()`` makes the drivers use the clock: it replaces
+    ``time.sleep`` and the ``monotonic`` function of the RPLCD modules, and
+    returns a function that undoes this. Only use it in tests.
+    """
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        if seconds > 0:
+            self.now += seconds
+
+    def advance_to(self, t):
+        self.now = max(self.now, t)
+
+    def install(self):
+        from . import arbiter, lcd, writebehind
+        modules = [c, lcd, writebehind, arbiter]
+        saved = [(module, module.monotonic) for module in modules]
+        sleep = time.sleep
+        for module in modules:
+            module.monotonic = self
+        time.sleep = self.sleep
+
+        def uninstall():
+            time.sleep = sleep
+            for module, func in saved:
+                module.monotonic = func
+        return uninstall
+
+
+class HD44780(object):
+    """
+    Model of the HD44780 controller.
+
+    The controller is driven through its bus lines with ``pins()``. Writes
+    are latched on the falling edge of E, in 8 bit or (after the function
+    set instruction) in 4 bit mode. The model keeps DDRAM, CGRAM, the address
+    counter, entry mode, display shift and the display control flags.
+
+    :param cols: Number of columns of the display. Default: ``20``.
+    :type cols: int
+    :param rows: Number of rows of the display. Default: ``4``.
+    :type rows: int
+
+    """
+
+    def __init__(self, cols=20, rows=4):
+        self.cols = cols
+        self.rows = rows
+        self.ddram = bytearray(b' ' * 128)
+        self.cgram = bytearray(64)
+        self.address = 0  # The address counter
+        self.cgram_selected = False
+        self.increment = True
+        self.shift_on_write = False
+        self.shift = 0  # Display shift, positive is to the right
+        self.display_on = False
+        self.cursor = False
+        self.blink = False
+        self.eight_bit = True  # Interface data length, 8 bit after power on
+        self.two_lines = False
+        self.backlight = None  # Set by the expander or GPIO wiring
+        self.output = None  # Value driven onto D7-D0 while E is high in read mode
+        self.violations = []  # (time, message) of every timing violation
+        self.instructions = 0  # Number of instructions executed
+        self.writes = 0  # Number of data writes
+        self._busy_until = 0.0
+        self._init_step = 0
+        self._nibble = None  # First nibble of a byte in 4 bit mode
+        self._read_nibble = None
+        self._lines = (0, 0, 0, 0)  # rs, rw, e, data
+        self._lines_t = (-1.0, -1.0)  # Last change of rs/rw and of data
+        self._e_rise = -1.0
+
+    # Bus interface
+
+    def pins(self, t, rs, rw, e, data):
+        """Set the levels of the bus lines at time ``t``. ``data`` are the
+        lines D7-D0, lines that are not connected read as 0."""
+        prs, prw, pe, pdata = self._lines
+        rsrw_t, data_t = self._lines_t
+        if (rs, rw) != (prs, prw):
+            if pe and not e and not prw:
+                self._violation(t, 'RS/RW hold time after E falls')
+            rsrw_t = t
+        if data != pdata:
+            data_t = t
+        if e and not pe:
+            if t - rsrw_t < T_AS:
+                self._violation(t, 'RS/RW setup time before E rises')
+            self._e_rise = t
+            if rw:
+                self._drive(t, rs)
+        elif pe and not e:
+            if t - self._e_rise < T_PW:
+                self._violation(t, 'E pulse width')
+            if self.output is not None:
+                self.output = None
+            elif not prw:
+                if data != pdata:
+                    self._violation(t, 'data hold time after E falls')
+                elif t - data_t < T_DSW:
+                    self._violation(t, 'data setup time before E falls')
+                self._latch(t, prs, pdata)
+        self._lines = (rs, rw, e, data)
+        self._lines_t = (rsrw_t, data_t)
+
+    def busy(self, t):
+        return t < self._busy_until
+
+    def _drive(self, t, rs):
+        """Put the busy flag and address counter (``rs`` low) or the data at
+        the address counter on the bus."""
+        if rs:
+            value = self._ram()[self.address & self._ram_mask()]
+        else:
+            value = (0x80 if self.busy(t) else 0) | (self.address & 0x7F)
+        if self.eight_bit:
+            self.output = value
+            if rs:
+                self._advance()
+        elif self._read_nibble is None:
+            self._read_nibble = value
+            self.output = value & 0xF0
+        else:
+            self.output = (self._read_nibble << 4) & 0xF0
+            self._read_nibble = None
+            if rs:
+                self._advance()
+
+    def _latch(self, t, rs, data):
+        if self.eight_bit:
+            value = data
+        elif self._nibble is None:
+            self._nibble = data & 0xF0
+            return
+        else:
+            value = self._nibble | (data >> 4)
+            self._nibble = None
+        if not rs and value == 0:
+            # Not an instruction, the upper nibble of 0x03 or 0x02 during
+            # 4 bit initialization seen by a controller in 8 bit mode
+            return
+        if self.busy(t):
+            self._violation(t, '%s 0x%02X written while busy (%.1f µs early)' % (
+                'data' if rs else 'instruction', value, (self._busy_until - t) * 1e6))
+        if rs:
+            self._write(t, value)
+        else:
+            self._execute(t, value)
+
+    def _violation(self, t, message):
+        self.violations.append((t, message))
+
+    # Instructions
+
+    def _execute(self, t, value):
+        exec_time = EXEC_TIME
+        self.instructions += 1
+        if value == c.LCD_CLEARDISPLAY:
+            self.ddram[:] = b' ' * 128
+            self.address = 0
+            self.cgram_selected = False
+            self.increment = True
+            self.shift = 0
+            exec_time = EXEC_TIME_LONG
+        elif value & 0xFE == c.LCD_RETURNHOME:
+            self.address = 0
+            self.cgram_selected = False
+            self.shift = 0
+            exec_time = EXEC_TIME_LONG
+        elif value & 0xFC == c.LCD_ENTRYMODESET:
+            self.increment = bool(value & 0x02)
+            self.shift_on_write = bool(value & 0x01)
+        elif value & 0xF8 == c.LCD_DISPLAYCONTROL:
+            self.display_on = bool(value & 0x04)
+            self.cursor = bool(value & 0x02)
+            self.blink = bool(value & 0x01)
+        elif value & 0xF0 == c.LCD_CURSORSHIFT:
+            step = 1 if value & c.LCD_MOVERIGHT else -1
+            if value & c.LCD_DISPLAYMOVE:
+                self.shift += step
+            else:
+                self._advance(step)
+        elif value & 0xE0 == c.LCD_FUNCTIONSET:
+            if self._init_step < len(INIT_TIMES) and value & c.LCD_8BITMODE:
+                exec_time = INIT_TIMES[self._init_step]
+                self._init_step += 1
+            self.eight_bit = bool(value & c.LCD_8BITMODE)
+            self.two_lines = bool(value & c.LCD_2LINE)
+            self._nibble = None
+            self._read_nibble = None
+        elif value & 0xC0 == c.LCD_SETCGRAMADDR:
+            self.cgram_selected = True
+            self.address = value & 0x3F
+        else:
+            self.cgram_selected = False
+            self.address = value & 0x7F
+        self._busy_until = t + exec_time
+
+    def _write(self, t, value):
+        self.writes += 1
+        self._ram()[self.address & self._ram_mask()] = value
+        self._advance()
+        if self.shift_on_write and not self.cgram_selected:
+            self.shift += -1 if self.increment else 1
+        self._busy_until = t + EXEC_TIME
+
+    def _ram(self):
+        return self.cgram if self.cgram_selected else self.ddram
+
+    def _ram_mask(self):
+        return 0x3F if self.cgram_selected else 0x7F
+
+    def _advance(self, step=None):
+        """Move the address counter by ``step``, by the entry mode if None."""
+        if step is None:
+            step = 1 if self.increment else -1
+        if self.cgram_selected:
+            self.address = (self.address + step) & 0x3F
+        elif self.two_lines:
+            # 0x00-0x27 and 0x40-0x67, the end of a line continues on the other
+            line, pos = divmod(self.address, 0x40)
+            pos += step
+            if pos > 0x27:
+                line, pos = line ^ 1, 0
+            elif pos < 0:
+                line, pos = line ^ 1, 0x27
+            self.address = line * 0x40 + pos
+        else:
+            self.address = (self.address + step) % 80
+
+    # Read back
+
+    def cell_address(self, row, col):
+        """The DDRAM address shown at ``row``, ``col`` with the current
+        display shift."""
+        if not self.two_lines:
+            return (row * self.cols + col - self.shift) % 80
+        base = (row // 2) * self.cols
+        return (row % 2) * 0x40 + (base + col - self.shift) % 40
+
+    def codes(self):
+        """The visible character codes, as a list of bytearrays per row."""
+        return [bytearray(self.ddram[self.cell_address(row, col)] for col in range(self.cols))
+                for row in range(self.rows)]
+
+    def text(self):
+        """The visible text, as a list of strings per row. Character codes
+        are mapped one to one to unicode code points, so ASCII text reads
+        back as itself and custom characters as ``'\\x00'`` to ``'\\x07'``."""
+        return [''.join(chr(code) for code in line) for line in self.codes()]
+
+    @property
+    def cursor_pos(self):
+        """The (row, col) of the address counter, or None if it is not on
+        a visible cell."""
+        if self.cgram_selected:
+            return None
+        for row in range(self.rows):
+            for col in range(self.cols):
+                if self.cell_address(row, col) == self.address:
+                    return (row, col)
+        return None
+
+    def glyph(self, location):
+        """The bitmap of custom character ``location`` as a list of 8 rows."""
+        return list(self.cgram[location * 8:location * 8 + 8])
+
+
+class PCF8574(object):
+    """
+    PCF8574 backpack wired to an :class:`HD44780`. Every byte written is a
+    new output state. Reads return the LCD data lines while it drives them,
+    the pins written low always read low.
+    """
+
+    def __init__(self, lcd):
+        self.lcd = lcd
+        self.state = 0xFF  # Outputs are high after power on
+
+    def receive(self, times, data):
+        for t, value in zip(times, data):
+            self.state = value
+            self.lcd.backlight = bool(value & PCF8574_BACKLIGHT)
+            self.lcd.pins(t, value & PCF8574_RS, value & PCF8574_RW, value & PCF8574_E, value & 0xF0)
+
+    def read(self, t):
+        driven = self.lcd.output
+        if driven is None:
+            return self.state
+        return (self.state & 0x0F) | (self.state & driven & 0xF0)
+
+
+class MCP230XX(object):
+    """
+    MCP23008 or MCP23017 (``BANK`` = 0) wired to an :class:`HD44780` like
+    the Adafruit backpack. In 8 bit mode (``gpio_bank`` ``AB`` or ``BA``)
+    the second bank carries D7-D0.
+
+    Writes to the GPIO and OLAT registers set the output latch. The register
+    pointer advances after every byte, unless IOCON.SEQOP is set: then it
+    stays, or toggles between the A and B register of the MCP23017.
+
+    :param lcd: The LCD.
+    :type lcd: :class:`HD44780`
+    :param chip: ``MCP23008`` or ``MCP23017``.
+    :type chip: str
+    :param gpio_bank: The bank the LCD is wired to on the MCP23017, see
+        :class:`~.i2c.CharLCD`. Default: ``A``.
+    :type gpio_bank: str
+    :param lcd2: The second controller of a 40x4 LCD, or None.
+    :type lcd2: :class:`HD44780`
+    :param pin_e2: The pin of the control bank wired to the E line of
+        ``lcd2``. Default: ``0``.
+    :type pin_e2: int
+
+    """
+
+    def __init__(self, lcd, chip='MCP23008', gpio_bank='A', lcd2=None, pin_e2=0):
+        self.lcd = lcd
+        self.lcd2 = lcd2
+        self._e2 = 1 << pin_e2
+        self.chip = chip
+        self.gpio_bank = gpio_bank
+        # Banks are (IODIR, GPIO, OLAT) register addresses
+        if chip == 'MCP23008':
+            self.registers = bytearray(11)
+            self._iocon = (0x05,)
+            banks = [(0x00, 0x09, 0x0A)]
+            self._control, self._data = banks[0], None
+        elif chip == 'MCP23017':
+            self.registers = bytearray(22)
+            self._iocon = (0x0A, 0x0B)
+            banks = [(0x00, 0x12, 0x14), (0x01, 0x13, 0x15)]
+            if gpio_bank in ['A', 'BA']:
+                self._control, self._data = banks
+            elif gpio_bank in ['B', 'AB']:
+                self._data, self._control = banks
+            else:
+                raise ValueError('Invalid GPIO bank: %s' % gpio_bank)
+            if len(gpio_bank) == 1:
+                self._data = None
+        else:
+            raise NotImplementedError('Unsupported chip: %s' % chip)
+        self._olat = {}  # GPIO register -> OLAT register
+        for iodir, gpio, olat in banks:
+            self.registers[iodir] = 0xFF  # All pins are inputs after power on
+            self._olat[gpio] = olat
+        self.pointer = 0
+
+    def receive(self, times, data):
+        self.pointer = data[0] % len(self.registers)
+        for t, value in zip(times[1:], data[1:]):
+            self._set(t, self.pointer, value)
+            self._advance()
+
+    def read(self, t):
+        register = self._olat.get(self.pointer, self.pointer)  # Outputs read their latch
+        self._advance()
+        return self.registers[register]
+
+    def _advance(self):
+        if self.registers[self._iocon[0]] & MCP230XX_IOCON_SEQOP:
+            if self.chip == 'MCP23017':
+                self.pointer ^= 1
+        else:
+            self.pointer = (self.pointer + 1) % len(self.registers)
+
+    def _set(self, t, register, value):
+        if register in self._iocon:
+            for iocon in self._iocon:
+                self.registers[iocon] = value
+            return
+        self.registers[self._olat.get(register, register)] = value
+        self._update(t)
+
+    def _pins(self, bank):
+        """Levels of the output pins of ``bank``, inputs read low."""
+        iodir, gpio, olat = bank
+        return self.registers[olat] & ~self.registers[iodir] & 0xFF
+
+    def _update(self, t):
+        control = self._pins(self._control)
+        if self._data is not None:
+            data = self._pins(self._data)
+        else:
+            data = ((control >> MCP230XX_DATASHIFT) & 0x0F) << 4
+        self.lcd.backlight = bool(control & MCP230XX_BACKLIGHT)
+        self.lcd.pins(t, control & MCP230XX_RS, 0, control & MCP230XX_E, data)
+        if self.lcd2 is not None:
+            self.lcd2.backlight = self.lcd.backlight
+            self.lcd2.pins(t, control & MCP230XX_RS, 0, control & self._e2, data)
+
+
+class Bus(object):
+    """
+    An I²C bus with emulated devices, used by :class:`SMBus`.
+
+    Transactions are timestamped: a transaction starts when the clock says
+    so, but not before the previous one ended, and each byte (including the
+    address byte) takes 9 bit times. Every data byte reaches its device at
+    the end of its acknowledge bit. A :class:`VirtualClock` is advanced to
+    the end of every transaction, like a real bus write would block.
+
+    :param port: The I²C port number. Default: ``1``.
+    :type port: int
+    :param bus_clock: The I²C clock in Hz. Default: ``100000``.
+    :type bus_clock: int
+    :param clock: The clock, a callable returning seconds. Default:
+        ``time.monotonic``.
+
+    """
+
+    ports = {}  # port number -> Bus
+
+    def __init__(self, port=1, bus_clock=100000, clock=None):
+        self.port = port
+        self.bus_clock = bus_clock
+        self.clock = clock or monotonic
+        self.devices = {}
+        self.log = []  # Transaction tuples
+        self.calls = 0  # SMBus calls, one ioctl or write syscall each on Linux
+        self.bytes = 0  # Bytes on the wire, including the address bytes
+        self._free_at = 0.0
+        Bus.ports[port] = self
+
+    def attach(self, address, device):
+        """Connect ``device`` at ``address``."""
+        self.devices[address] = device
+        return device
+
+    @property
+    def busy_time(self):
+        """Total time the bus was in use, in seconds."""
+        return sum(tx.end - tx.start for tx in self.log)
+
+    def transfer(self, address, kind, data=()):
+        """Run one transaction and return the byte read, if any."""
+        device = self.devices.get(address)
+        if device is None:
+            raise IOError(errno.EREMOTEIO, 'No device at 0x%02X on bus %d' % (address, self.port))
+        byte_time = 9.0 / self.bus_clock
+        start = max(self.clock(), self._free_at)
+        nbytes = len(data) + (2 if kind == 'read' else 1)
+        end = start + nbytes * byte_time
+        result = None
+        if data:
+            times = [start + (i + 2) * byte_time for i in range(len(data))]
+            device.receive(times, bytearray(data))
+        if kind == 'read':
+            result = device.read(end)
+        self.log.append(Transaction(start, end, address, kind, bytes(bytearray(data))))
+        self.bytes += nbytes
+        self._free_at = end
+        if hasattr(self.clock, 'advance_to'):
+            self.clock.advance_to(end)
+        return result
+
+
+class SMBus(object):
+    """
+    Drop-in for ``smbus.SMBus`` and :class:`~.i2c.I2CDev` that talks to
+    the emulated devices of a :class:`Bus`. Replace ``i2c.SMBus`` or
+    ``i2c.I2CDev`` with this class, or register this module as ``smbus``.
+
+    :param port: The I²C port number, a :class:`Bus` of that port must
+        exist. Default: ``1``.
+    :type port: int
+
+    """
+
+    def __init__(self, port=1):
+        if port not in Bus.ports:
+            raise IOError(errno.ENOENT, 'No emulated bus %d' % port)
+        self.bus = Bus.ports[port]
+
+    def write(self, address, data):
+        self.bus.calls += 1
+        self.bus.transfer(address, 'write', data)
+
+    def write_byte(self, address, value):
+        self.bus.calls += 1
+        self.bus.transfer(address, 'write', [value])
+
+    def write_byte_data(self, address, register, value):
+        self.bus.calls += 1
+        self.bus.transfer(address, 'write', [register, value])
+
+    def write_i2c_block_data(self, address, register, data):
+        if len(data) > SMBUS_BLOCK_MAX:
+            raise ValueError('Data length cannot exceed %d bytes' % SMBUS_BLOCK_MAX)
+        self.bus.calls += 1
+        self.bus.transfer(address, 'write', [register] + list(data))
+
+    def read_byte(self, address):
+        self.bus.calls += 1
+        return self.bus.transfer(address, 'read')
+
+    def read_byte_data(self, address, register):
+        # A write and a read with repeated start, in one ioctl
+        self.bus.calls += 1
+        self.bus.transfer(address, 'write', [register])
+        return self.bus.transfer(address, 'read')
+
+    def close(self):
+        pass
+
+
+class GPIO(object):
+    """
+    Stand-in for the ``RPi.GPIO`` module, wired to an :class:`HD44780` like
+    the :class:`~.gpio.CharLCD` pin arguments. Call ``install()`` before
+    importing :mod:`RPLCD.gpio`.
+
+    :param lcd: The LCD.
+    :type lcd: :class:`HD44780`
+    :param pin_rs: Pin number of RS.
+    :type pin_rs: int
+    :param pin_e: Pin number of E.
+    :type pin_e: int
+    :param pins_data: The 4 (D4-D7) or 8 (D0-D7) data pin numbers.
+    :type pins_data: list of int
+    :param pin_rw: Pin number of RW, or None if it is tied to ground.
+    :type pin_rw: int
+    :param pin_backlight: Pin number of the backlight switch, or None.
+    :type pin_backlight: int
+    :param clock: The clock, a callable returning seconds. Default:
+        ``time.monotonic``.
+    :param call_time: Time a GPIO call takes, a :class:`VirtualClock` is
+        advanced by it. Default: ``1e-6``.
+    :type call_time: float
+    :param lcd2: The second controller of a 40x4 LCD, or None.
+    :type lcd2: :class:`HD44780`
+    :param pin_e2: Pin number of the E line of ``lcd2``.
+    :type pin_e2: int
+
+    """
+
+    BOARD = 10
+    BCM = 11
+    OUT = 0
+    IN = 1
+    LOW = 0
+    HIGH = 1
+
+    def __init__(self, lcd, pin_rs, pin_e, pins_data, pin_rw=None, pin_backlight=None,
+                 clock=None, call_time=1e-6, lcd2=None, pin_e2=None):
+        if len(pins_data) not in [4, 8]:
+            raise ValueError('There should be exactly 4 or 8 data pins.')
+        self.lcd = lcd
+        self.lcd2 = lcd2
+        self.pins = {'rs': pin_rs, 'e': pin_e, 'rw': pin_rw, 'backlight': pin_backlight, 'e2': pin_e2}
+        # Data pin number -> bit, 4 pins are D4-D7
+        self.data = dict((pin, 7 - i) for i, pin in enumerate(reversed(pins_data)))
+        self.clock = clock or monotonic
+        self.call_time = call_time
+        self.mode = None
+        self.directions = {}
+        self.levels = {}
+        self.calls = 0
+
+    def install(self):
+        """Register as the ``RPi.GPIO`` module."""
+        package = types.ModuleType('RPi')
+        package.GPIO = self
+        sys.modules['RPi'] = package
+        sys.modules['RPi.GPIO'] = self
+
+    def setmode(self, mode):
+        self.mode = mode
+
+    def setwarnings(self, flag):
+        pass
+
+    def setup(self, pin, direction):
+        self._tick()
+        self.directions[pin] = direction
+
+    def output(self, pin, value):
+        t = self._tick()
+        if self.directions.get(pin) != self.OUT:
+            raise RuntimeError('The GPIO channel has not been set up as an OUTPUT')
+        self.levels[pin] = 1 if value else 0
+        if pin == self.pins['backlight']:
+            self.lcd.backlight = bool(value)
+            if self.lcd2 is not None:
+                self.lcd2.backlight = bool(value)
+        else:
+            self._update(t)
+
+    def input(self, pin):
+        self._tick()
+        driven = self.lcd.output
+        if driven is None and self.lcd2 is not None:
+            driven = self.lcd2.output
+        if pin in self.data and driven is not None:
+            return (driven >> self.data[pin]) & 1
+        return self.levels.get(pin, 0)
+
+    def cleanup(self):
+        self.directions = {}
+
+    def _tick(self):
+        self.calls += 1
+        if hasattr(self.clock, 'advance_to') and self.call_time:
+            self.clock.sleep(self.call_time)
+        return self.clock()
+
+    def _level(self, name):
+        pin = self.pins[name]
+        return self.levels.get(pin, 0) if pin is not None else 0
+
+    def _update(self, t):
+        data = 0
+        for pin, bit in self.data.items():
+            if self.directions.get(pin) == self.OUT:
+                data |= self.levels.get(pin, 0) << bit
+        self.lcd.pins(t, self._level('rs'), self._level('rw'), self._level('e'), data)
+        if self.lcd2 is not None:
+            self.lcd2.pins(t, self._level('rs'), self._level('rw'), self._level('e2'), data)
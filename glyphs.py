@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2013-2017 Danilo Bargen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+
+from .compat import range
+
+
+class GlyphManager(object):
+    """
+    Allocates the 8 CGRAM locations of one or more LCDs to named glyphs.
+
+    Glyphs are registered with a name and a bitmap and uploaded on demand
+    by :meth:`code`. A glyph keeps its location while it is used. When all
+    locations are taken, the least recently used glyph that no visible cell
+    shows is replaced, so the characters on the screen never change their
+    look. Glyphs with the same bitmap share a location and
+    :meth:`~.lcd.BaseCharLCD.create_char` only sends the rows that changed.
+
+    The LCDs must show the same content (e.g. mirrors), the codes are the
+    same for all of them. Call :meth:`release` after each screen: the glyphs
+    handed out since the previous call are kept until then, even if they are
+    not on the LCD yet.
+
+    :param lcds: The LCDs whose CGRAM is managed.
+    :type lcds: list of :class:`~.lcd.BaseCharLCD`
+
+    Example:
+
+    .. sourcecode:: python
+
+        >>> glyphs = GlyphManager([lcd])
+        >>> glyphs.register('smiley', smiley)
+        >>> lcd.write_string('Hi ' + glyphs.char('smiley', ':)'))
+
+    """
+
+    def __init__(self, lcds):
+        self._lcds = list(lcds)
+        self._bitmaps = {}  # Registered glyphs, name -> bitmap
+        self._names = {}  # Name -> location it was last uploaded to
+        self._slots = [None] * 8  # Bitmap of each location, None if free
+        self._last_use = [0] * 8  # Tick of the last use of each location
+        self._tick = 0
+        self._released = 0  # Locations used after this tick are kept
+        self._kept = set()  # Locations kept until the next release
+
+    def register(self, name, bitmap):
+        """Register (or change) the glyph ``name``. Nothing is sent yet.
+
+        :param name: The name of the glyph.
+        :type name: str
+        :param bitmap: 8 numbers, each representing a 5 pixel row.
+        :type bitmap: tuple of int
+        :raises ValueError: Raised when the bitmap has an incorrect size.
+
+        """
+        bitmap = tuple(bitmap)
+        if len(bitmap) != 8:
+            raise ValueError('Bitmap should have exactly 8 rows.')
+        self._bitmaps[name] = bitmap
+
+    def code(self, name):
+        """Return the character code (0-7) of the glyph ``name``, after
+        uploading it if it is not in CGRAM. Returns None if every location
+        is taken by a glyph that is visible or kept.
+
+        :raises KeyError: Raised when no glyph ``name`` is registered.
+
+        """
+        bitmap = self._bitmaps[name]
+        location = self._names.get(name)
+        if location is None or self._slots[location] != bitmap:
+            location = self._allocate(bitmap)
+            if location is None:
+                return None
+            self._names[name] = location
+        self._tick += 1
+        self._last_use[location] = self._tick
+        return location
+
+    def char(self, name, fallback=None):
+        """Like :meth:`code`, but return the glyph as a character, or
+        ``fallback`` if there is no location for it."""
+        location = self.code(name)
+        if location is None:
+            return fallback
+        return chr(location)
+
+    def release(self, keep=()):
+        """Allow replacing the glyphs handed out so far once they are no
+        longer visible. Call after a screen was drawn.
+
+        :param keep: Character codes to keep although they are not visible
+            now, e.g. of text that scrolls in later.
+        :type keep: iterable of int
+
+        """
+        self._released = self._tick
+        self._kept = set(code & 7 for code in keep if code < 16)
+
+    def _allocate(self, bitmap):
+        if bitmap in self._slots:
+            return self._slots.index(bitmap)
+        visible = self._visible()
+        free = [location for location in range(8)
+                if location not in visible and location not in self._kept and
+                self._last_use[location] <= self._released]
+        if not free:
+            return None
+        # Empty locations first, then the least recently used glyph
+        location = min(free, key=lambda location: (self._slots[location] is not None,
+                                                   self._last_use[location]))
+        for lcd in self._lcds:
+            lcd.create_char(location, bitmap)
+        self._slots[location] = bitmap
+        return location
+
+    def _visible(self):
+        """The locations shown by any cell of the LCDs. Codes 8-15 show the
+        same glyphs as 0-7."""
+        visible = set()
+        for lcd in self._lcds:
+            for line in lcd._content:
+                for location in range(8):
+                    if location in line or location + 8 in line:
+                        visible.add(location)
+        return visible
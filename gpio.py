@@ -28,10 +28,10 @@ import RPi.GPIO as GPIO
 
 from . import common as c
 from .lcd import BaseCharLCD
-from .compat import range
+from .compat import monotonic, range
 
 
-PinConfig = namedtuple('PinConfig', 'rs rw e d0 d1 d2 d3 d4 d5 d6 d7 backlight mode')
+PinConfig = namedtuple('PinConfig', 'rs rw e d0 d1 d2 d3 d4 d5 d6 d7 backlight e2 mode')
 
 
 class CharLCD(BaseCharLCD):
@@ -40,7 +40,10 @@ class CharLCD(BaseCharLCD):
                        backlight_enabled=True,
                        cols=20, rows=4, dotsize=8,
                        charmap='A02',
-                       auto_linebreaks=True):
+                       auto_linebreaks=True,
+                       busy_flag_polling=False,
+                       write_behind=False,
+                       pin_e2=None):
         """
         Character LCD controller.
 
@@ -85,6 +88,23 @@ class CharLCD(BaseCharLCD):
         :param auto_linebreaks: Whether or not to automatically insert line
             breaks. Default: ``True``.
         :type auto_linebreaks: bool
+        :param busy_flag_polling: Poll the busy flag of the LCD instead of
+            waiting fixed delays. Needs ``pin_rw``, otherwise the fixed delays
+            are used. Only use this if the LCD runs at 3.3V or D7 is level
+            shifted, the Raspberry Pi GPIOs are not 5V tolerant.
+            Default: ``False``.
+        :type busy_flag_polling: bool
+        :param write_behind: Don't block on the bus: writes only update an
+            in-memory frame, a dedicated I/O thread sends the changes to the
+            LCD. Pending writes to the same cell are merged. See ``flush()``
+            and ``queue_depth``. Default: ``False``.
+        :type write_behind: bool
+        :param pin_e2: Pin of the E line of the second controller of 40x4
+            LCDs, which have one controller for rows 0-1 and one for rows
+            2-3. The other pins are shared. Writes alternate between the
+            controllers, so one executes while the other gets the next byte.
+            Needs ``rows=4``. Default: ``None`` (one controller).
+        :type pin_e2: int
 
         """
         # Set attributes
@@ -97,6 +117,8 @@ class CharLCD(BaseCharLCD):
             raise ValueError('pin_rs is not defined.')
         if pin_e is None:
             raise ValueError('pin_e is not defined.')
+        if pin_e2 is not None:
+            self._controllers = 2
 
         if len(pins_data) == 4:  # 4 bit mode
             self.data_bus_mode = c.LCD_4BITMODE
@@ -110,14 +132,16 @@ class CharLCD(BaseCharLCD):
         self.pins = PinConfig(rs=pin_rs, rw=pin_rw, e=pin_e,
                               d0=block1[0], d1=block1[1], d2=block1[2], d3=block1[3],
                               d4=block2[0], d5=block2[1], d6=block2[2], d7=block2[3],
-                              backlight=pin_backlight,
+                              backlight=pin_backlight, e2=pin_e2,
                               mode=numbering_mode)
         self.backlight_mode = backlight_mode
 
         # Call superclass
         super(CharLCD, self).__init__(cols, rows, dotsize,
                                       charmap=charmap,
-                                      auto_linebreaks=auto_linebreaks)
+                                      auto_linebreaks=auto_linebreaks,
+                                      busy_flag_polling=busy_flag_polling,
+                                      write_behind=write_behind)
 
         # Set backlight status
         if pin_backlight is not None:
@@ -135,6 +159,8 @@ class CharLCD(BaseCharLCD):
         c.msleep(50)
         GPIO.output(self.pins.rs, 0)
         GPIO.output(self.pins.e, 0)
+        if self.pins.e2 is not None:
+            GPIO.output(self.pins.e2, 0)
         if self.pins.rw is not None:
             GPIO.output(self.pins.rw, 0)
 
@@ -162,12 +188,47 @@ class CharLCD(BaseCharLCD):
     backlight_enabled = property(_get_backlight_enabled, _set_backlight_enabled,
             doc='Whether or not to turn on the backlight.')
 
+    def _read_busy_flag(self):
+        if self.pins.rw is None:
+            return None
+        # The LCD drives the data bus while reading
+        data_pins = [pin for pin in self.pins[3:11] if pin is not None]
+        for pin in data_pins:
+            GPIO.setup(pin, GPIO.IN)
+        GPIO.output(self.pins.rs, c.RS_INSTRUCTION)
+        GPIO.output(self.pins.rw, 1)
+        GPIO.output(self.pins.e, 1)
+        c.usleep(1)
+        busy = GPIO.input(self.pins.d7)
+        self._stats['bus_reads'] += 1
+        GPIO.output(self.pins.e, 0)
+        if self.data_bus_mode == c.LCD_4BITMODE:
+            # Clock out the second nibble
+            c.usleep(1)
+            GPIO.output(self.pins.e, 1)
+            c.usleep(1)
+            GPIO.output(self.pins.e, 0)
+        GPIO.output(self.pins.rw, 0)
+        for pin in data_pins:
+            GPIO.setup(pin, GPIO.OUT)
+        return bool(busy)
+
     # Low level commands
 
     def _send(self, value, mode):
         """Send the specified value to the display with automatic 4bit / 8bit
         selection. The rs_mode is either ``RS_DATA`` or ``RS_INSTRUCTION``."""
 
+        # Wait for the previous write here instead of after each pulse
+        if self.busy_flag_polling:
+            self._delay(100)
+        elif self._controllers > 1:
+            self._wait_ready()
+
+        # Time on the GPIOs, without the sleeps of the enable pulses
+        start = monotonic()
+        slept = self._stats['sleep_time']
+
         # Choose instruction or data mode
         GPIO.output(self.pins.rs, mode)
 
@@ -181,13 +242,22 @@ class CharLCD(BaseCharLCD):
         else:
             self._write4bits(value >> 4)
             self._write4bits(value)
+        if self._controllers > 1:
+            self._settle(100)  # commands need > 37us to settle
+
+        stats = self._stats
+        stats['transmit_time'] += monotonic() - start - (stats['sleep_time'] - slept)
 
     def _send_data(self, value):
         """Send data to the display. """
+        self._stats['data_bytes'] += 1
         self._send(value, c.RS_DATA)
 
     def _send_instruction(self, value):
         """Send instruction to the display. """
+        self._stats['instructions'] += 1
+        if value & c.LCD_SETDDRAMADDR:
+            self._stats['cursor_moves'] += 1
         self._send(value, c.RS_INSTRUCTION)
 
     def _write4bits(self, value):
@@ -206,9 +276,37 @@ class CharLCD(BaseCharLCD):
 
     def _pulse_enable(self):
         """Pulse the `enable` flag to process data."""
+        self._stats['bus_writes'] += 1
+        if self._controllers > 1:
+            # The E lines of the selected controllers, see ``_select()``
+            pins = [pin for i, pin in enumerate((self.pins.e, self.pins.e2)) if self._target >> i & 1]
+            for pin in pins:
+                GPIO.output(pin, 0)
+            self._sleep(1)
+            for pin in pins:
+                GPIO.output(pin, 1)
+            self._sleep(1)
+            for pin in pins:
+                GPIO.output(pin, 0)
+            return
         GPIO.output(self.pins.e, 0)
-        c.usleep(1)
+        self._sleep(1)
         GPIO.output(self.pins.e, 1)
-        c.usleep(1)
+        self._sleep(1)
         GPIO.output(self.pins.e, 0)
-        c.usleep(100)  # commands need > 37us to settle
+        if not self.busy_flag_polling:
+            self._sleep(100)  # commands need > 37us to settle
+
+    def _write_costs(self):
+        """The time of a character and of an address instruction, counting
+        a few microseconds per GPIO call."""
+        if self.data_bus_mode == c.LCD_8BITMODE:
+            nibbles, calls = 1, 2 + 8 + 3
+        else:
+            nibbles, calls = 2, 2 + 2 * (4 + 3)
+        settle = 0 if self.busy_flag_polling else 100  # see ``_pulse_enable``
+        data = calls * 2 + nibbles * (2 + settle)
+        if self._controllers > 1:
+            # The controllers settle while the other one is written
+            data = max(calls * 2 + nibbles * 2, settle / 2)
+        return data, data + 50
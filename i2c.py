@@ -22,10 +22,22 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
 
-from smbus import SMBus
-
+import fcntl
+import math
+import os
+
+try:
+    from smbus import SMBus
+except ImportError:
+    try:
+        from smbus2 import SMBus
+    except ImportError:
+        SMBus = None
+
+from . import arbiter
 from . import common as c
-from .lcd import BaseCharLCD
+from .compat import monotonic, range
+from .lcd import BaseCharLCD, batched
 
 # PCF8574 backlight control
 PCF8574_BACKLIGHT = 0x08
@@ -33,8 +45,8 @@ PCF8574_NOBACKLIGHT = 0x00
 
 # PCF8574 Pin bitmasks
 PCF8574_E = 0x4
-PIN_READ_WRITE = 0x2  # Not used?
-PIN_REGISTER_SELECT = 0x1  # Not used?
+PIN_READ_WRITE = 0x2
+PIN_REGISTER_SELECT = 0x1
 
 # MCP230XX backlight control
 MCP230XX_BACKLIGHT = 0x80
@@ -46,23 +58,151 @@ MCP230XX_E = 0x4
 MCP230XX_DATAMASK = 0x78
 MCP230XX_DATASHIFT = 3
 
+# MCP230XX IOCON bit that disables the address pointer increment ("byte mode")
+MCP230XX_IOCON_SEQOP = 0x20
+
 # MCP23008 Register addresses
 MCP23008_IODIR = 0x00
+MCP23008_IOCON = 0x05
 MCP23008_GPIO = 0x09
 
-# MCP23017 Register addresses
+# MCP23017 Register addresses (IOCON.BANK = 0)
 MCP23017_IODIRA = 0x00
 MCP23017_IODIRB = 0x01
+MCP23017_IOCON = 0x0A
 MCP23017_GPIOA = 0x12
 MCP23017_GPIOB = 0x13
+MCP23017_OLATA = 0x14
+MCP23017_OLATB = 0x15
+
+# Maximum number of data bytes in a single SMBus block transaction
+SMBUS_BLOCK_MAX = 32
+
+# Maximum number of idle bytes the pacer inserts into a batch instead of
+# flushing it and sleeping
+PACING_MAX_PADDING = 16
+
+# Linux i2c-dev: ioctl to set the slave address, and maximum size of a write()
+I2C_SLAVE = 0x0703
+I2C_DEV_WRITE_MAX = 8192
+
+
+class I2CDev(object):
+    """
+    Raw ``/dev/i2c-N`` transport.
+
+    Implements the subset of the ``smbus.SMBus`` interface used by
+    :class:`CharLCD`, plus :meth:`write` to send a run of bytes as a single
+    I²C write transaction. The device node is opened once and the slave
+    address is only set again when it changes.
+    """
+
+    def __init__(self, port):
+        self.fd = os.open('/dev/i2c-%d' % port, os.O_RDWR)
+        self._address = None
+
+    def _select(self, address):
+        if address != self._address:
+            fcntl.ioctl(self.fd, I2C_SLAVE, address)
+            self._address = address
+
+    def write(self, address, data):
+        """Send ``data`` (a bytes-like object) to the device at ``address``."""
+        self._select(address)
+        data = memoryview(data)
+        for i in range(0, len(data), I2C_DEV_WRITE_MAX):
+            os.write(self.fd, data[i:i + I2C_DEV_WRITE_MAX])
+
+    def write_byte(self, address, value):
+        self.write(address, bytearray([value]))
+
+    def write_byte_data(self, address, register, value):
+        self.write(address, bytearray([register, value]))
+
+    def write_i2c_block_data(self, address, register, data):
+        self.write(address, bytearray([register]) + bytearray(data))
+
+    def read_byte(self, address):
+        self._select(address)
+        return bytearray(os.read(self.fd, 1))[0]
+
+    def read_byte_data(self, address, register):
+        self.write(address, bytearray([register]))
+        return bytearray(os.read(self.fd, 1))[0]
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class MeteredBus(object):
+    """
+    Wrapper for an ``smbus.SMBus`` like object (or :class:`I2CDev`) that
+    counts the transactions and the time spent in them in the ``stats``
+    dict of an LCD, see :meth:`~.lcd.BaseCharLCD.stats`.
+    """
+
+    def __init__(self, bus, stats):
+        self.bus = bus
+        self.stats = stats
+
+    def _done(self, start, kind):
+        self.stats['transmit_time'] += monotonic() - start
+        self.stats[kind] += 1
+
+    def write(self, address, data):
+        start = monotonic()
+        self.bus.write(address, data)
+        self._done(start, 'bus_writes')
+
+    def write_byte(self, address, value):
+        start = monotonic()
+        self.bus.write_byte(address, value)
+        self._done(start, 'bus_writes')
+
+    def write_byte_data(self, address, register, value):
+        start = monotonic()
+        self.bus.write_byte_data(address, register, value)
+        self._done(start, 'bus_writes')
+
+    def write_i2c_block_data(self, address, register, data):
+        start = monotonic()
+        self.bus.write_i2c_block_data(address, register, data)
+        self._done(start, 'bus_writes')
+
+    def read_byte(self, address):
+        start = monotonic()
+        value = self.bus.read_byte(address)
+        self._done(start, 'bus_reads')
+        return value
+
+    def read_byte_data(self, address, register):
+        start = monotonic()
+        value = self.bus.read_byte_data(address, register)
+        self._done(start, 'bus_reads')
+        return value
+
+    def close(self):
+        self.bus.close()
 
 
 class CharLCD(BaseCharLCD):
+
     def __init__(self, i2c_expander, address, expander_params=None, port=1,
                        cols=20, rows=4, dotsize=8,
                        charmap='A02',
                        auto_linebreaks=True,
-                       backlight_enabled=True):
+                       backlight_enabled=True,
+                       batched=False,
+                       transport='smbus',
+                       nibble_encoding='classic',
+                       bus_clock=None,
+                       pacing_margin=1.5,
+                       busy_flag_polling=False,
+                       write_behind=False,
+                       bus_arbiter=False,
+                       bus_max_hold=None):
         """
         CharLCD via PCF8574 I2C port expander:
 
@@ -94,6 +234,17 @@ class CharLCD(BaseCharLCD):
             7  | 6  | 5  | 4  | 3  | 2 | 1  | 0
             BL | D7 | D6 | D5 | D4 | E | RS | -
 
+            8-bit operation on the MCP23017 (``gpio_bank`` ``AB`` or ``BA``),
+            data bank and control bank pin mapping::
+
+            7  | 6  | 5  | 4  | 3  | 2  | 1  | 0
+            D7 | D6 | D5 | D4 | D3 | D2 | D1 | D0
+            BL | -  | -  | -  | -  | E  | RS | -
+
+            40x4 LCDs have two controllers, one for rows 0-1 and one for rows
+            2-3, with an E line each. The E line of the second controller goes
+            to a free pin of the control bank (``pin_e2``), e.g. GP0.
+
 
         :param address: The I2C address of your LCD.
         :type address: int
@@ -102,6 +253,12 @@ class CharLCD(BaseCharLCD):
         :param expander_params: Parameters for expanders, in a dictionary. Only needed for MCP23017
             gpio_bank - This must be either ``A`` or ``B``
                          If you have a HAT, A is usually marked 1 and B is 2
+                         ``AB`` drives the LCD in 8-bit mode with the data bus
+                         on bank A and the control pins on bank B, ``BA`` the
+                         other way around.
+            pin_e2 - The pin (0-7) of the control bank that drives the E line
+                     of the second controller of a 40x4 LCD, only on the
+                     MCP230XX. Needs ``rows=4``.
             Example: expander_params={'gpio_bank': 'A'}
         :type expander_params: dictionary
         :param port: The I2C port number. Default: ``1``.
@@ -121,12 +278,83 @@ class CharLCD(BaseCharLCD):
         :type auto_linebreaks: bool
         :param backlight_enabled: Whether the backlight is enabled initially. Default: ``True``.
         :type backlight_enabled: bool
+        :param batched: Buffer the expander bytes of each operation (e.g. a whole
+            ``write_string`` call or a ``batch()`` block) and send them in I²C block
+            transactions instead of one SMBus call per expander state. The byte
+            sequence on the bus is the same, but the short settle delays are left
+            to the bus timing, which covers them at bus clocks up to 400 kHz
+            (set ``bus_clock`` for exact pacing). On the MCP230XX this switches
+            the chip to byte mode (``IOCON.SEQOP``) so that a block write
+            repeatedly hits the GPIO register. On the MCP23017 byte mode toggles
+            between the A and B registers, so the other bank is rewritten with
+            its current output latch value; don't drive it from elsewhere while
+            batched mode is in use. Default: ``False``.
+        :type batched: bool
+        :param transport: How to talk to the I2C bus. Supported: ``smbus`` (the
+            ``smbus`` or ``smbus2`` package, one call per SMBus transaction) and
+            ``i2c-dev`` (writes straight to the ``/dev/i2c-N`` file descriptor,
+            no Python package needed). In batched mode ``i2c-dev`` sends each
+            run of expander bytes with a single ``write()``. Default: ``smbus``.
+        :type transport: str
+        :param nibble_encoding: How each nibble is clocked into the LCD. ``classic``
+            writes four expander states per nibble (data, E low, E high, E low).
+            ``minimal`` only writes E high and E low, plus a leading E low state
+            when RS changes, as RS has to be stable before E rises. Data is
+            latched on the falling edge, so it may change together with the
+            rising edge. This cuts the bus bytes per character from 8 to 4
+            (5 after an instruction) on the PCF8574, and the GPIO register
+            writes per nibble from 3 to 2 on the MCP230XX. Default: ``classic``.
+        :type nibble_encoding: str
+        :param bus_clock: The I2C bus clock in Hz (usually 100000 on a Raspberry Pi).
+            If set, the fixed delays are replaced by a :class:`~.common.Pacer`
+            that only waits for the part of the HD44780 execution times that
+            the bus transfer does not already cover. Default: ``None`` (fixed
+            delays).
+        :type bus_clock: int
+        :param pacing_margin: Safety factor applied to the HD44780 execution
+            times when ``bus_clock`` is set. Default: ``1.5``.
+        :type pacing_margin: float
+        :param busy_flag_polling: Read the busy flag after clear and home
+            instead of waiting the full execution time. Only possible with the
+            PCF8574, which has the RW pin connected. Ignored on the MCP230XX.
+            A read costs about 1 ms of bus time at 100 kHz, so polling only
+            kicks in from about 200 kHz (see ``bus_clock``, 100 kHz is
+            assumed without it). Default: ``False``.
+        :type busy_flag_polling: bool
+        :param write_behind: Don't block on the bus: writes only update an
+            in-memory frame, a dedicated I/O thread sends the changes to the
+            LCD. Pending writes to the same cell are merged. See ``flush()``
+            and ``queue_depth``. Default: ``False``.
+        :type write_behind: bool
+        :param bus_arbiter: Share the I2C port with other users through its
+            :func:`~.arbiter.bus_arbiter`. Every bus transaction holds the
+            arbiter, and batched writes are split into chunks that fit into
+            its ``max_hold`` time. Default: ``False``.
+        :type bus_arbiter: bool
+        :param bus_max_hold: The ``max_hold`` time of the bus arbiter in
+            seconds, see :func:`~.arbiter.bus_arbiter`. Shorter times let
+            other users of the bus wait less, at the cost of more bus
+            transactions. Default: ``None`` (the arbiter's).
+        :type bus_max_hold: float
 
         """
         # Set own address and port.
         self._address = address
         self._port = port
 
+        # Set transport, 'smbus' and 'i2c-dev' are supported.
+        if transport in ['smbus', 'i2c-dev']:
+            self._transport = transport
+        else:
+            raise NotImplementedError('I2C transport "%s" is not supported.' % transport)
+
+        # Set nibble encoding, 'classic' and 'minimal' are supported.
+        if nibble_encoding in ['classic', 'minimal']:
+            self._nibble_encoding = nibble_encoding
+        else:
+            raise ValueError('The ``nibble_encoding`` argument must be either '
+                             '``classic`` or ``minimal``')
+
         # Set i2c expander, 'PCF8574', 'MCP23008' and 'MCP23017' are supported.
         if i2c_expander in ['PCF8574', 'MCP23008', 'MCP23017']:
             self._i2c_expander = i2c_expander
@@ -141,16 +369,64 @@ class CharLCD(BaseCharLCD):
             else:
                 self._expander_params = {}
         else:
+            self._expander_params = {}
             if self._i2c_expander == 'MCP23017':
-                if expander_params['gpio_bank'] in ['A', 'B']:
-                    self._expander_params = {}
+                if expander_params['gpio_bank'] in ['A', 'B', 'AB', 'BA']:
                     self._expander_params['gpio_bank'] = expander_params['gpio_bank']
                 else:
                     raise ValueError('MCP23017: expander_params[\'gpio_bank\'] is \'%s\', '
-                            'must be either \'A\' or \'B\'' % expander_params['gpio_bank'])
-
-        # Currently the I2C mode only supports 4 bit communication
-        self.data_bus_mode = c.LCD_4BITMODE
+                            'must be one of \'A\', \'B\', \'AB\' or \'BA\''
+                            % expander_params['gpio_bank'])
+            if expander_params.get('pin_e2') is not None:
+                if self._i2c_expander == 'PCF8574':
+                    raise ValueError('PCF8574: all pins are in use, pin_e2 needs a MCP230XX.')
+                self._expander_params['pin_e2'] = expander_params['pin_e2']
+
+        # 8 bit communication is only possible with both banks of the MCP23017
+        if len(self._expander_params.get('gpio_bank', '')) == 2:
+            self.data_bus_mode = c.LCD_8BITMODE
+        else:
+            self.data_bus_mode = c.LCD_4BITMODE
+
+        # E line of the second controller of 40x4 LCDs, see ``_select``
+        self._mcp_e2 = 0
+        pin_e2 = self._expander_params.get('pin_e2')
+        if pin_e2 is not None:
+            used = MCP230XX_RS | MCP230XX_E | MCP230XX_BACKLIGHT
+            if self.data_bus_mode == c.LCD_4BITMODE:
+                used |= MCP230XX_DATAMASK
+            if pin_e2 not in range(8) or 1 << pin_e2 & used:
+                raise ValueError('MCP230XX: expander_params[\'pin_e2\'] is %r, '
+                                 'must be a free pin of the control bank' % (pin_e2,))
+            self._mcp_e2 = 1 << pin_e2
+            self._controllers = 2
+
+        # Transmit buffer, only used in batched mode
+        self._tx_buffer = bytearray() if batched else None
+
+        # Expander bytes per data byte, by RS mode, see ``_wire_table``
+        self._wire_tables = {}
+        # Delays after each state of a byte in unbatched mode, see ``_transmit``
+        self._transmit_delays = None
+
+        # Shared bus lock, see ``_init_connection``
+        self._arbiter = arbiter.bus_arbiter(port, bus_max_hold) if bus_arbiter else None
+
+        # Pacing engine, replaces the fixed delays if the bus clock is known
+        self._pacer = c.Pacer(bus_clock, pacing_margin, self._controllers) if bus_clock else None
+
+        # A busy flag read is five writes and a read, each a transaction of its
+        # own. Polling ends up to one read after the LCD is ready, so it only
+        # beats the fixed delay if that is at least two reads long. At 100 kHz
+        # not even clear and home are.
+        self._busy_poll_min_delay = 2 * 6 * 2 * 9 * 1000000.0 / (bus_clock or 100000)
+
+        # Whether the pacer has to space the characters of a run, i.e. the bus
+        # time up to the first enable edge of a character doesn't cover the
+        # execution time of the previous one (above about 300 kHz)
+        edge = 2 if nibble_encoding == 'minimal' else 3
+        self._run_paced = (self._pacer is not None and
+                           edge * self._pacer.byte_time * 1000000 < c.EXEC_TIME * pacing_margin)
 
         # Set backlight status
         if self._i2c_expander == 'PCF8574':
@@ -161,18 +437,34 @@ class CharLCD(BaseCharLCD):
         # Call superclass
         super(CharLCD, self).__init__(cols, rows, dotsize,
                                       charmap=charmap,
-                                      auto_linebreaks=auto_linebreaks)
+                                      auto_linebreaks=auto_linebreaks,
+                                      busy_flag_polling=busy_flag_polling,
+                                      write_behind=write_behind)
         # Refresh backlight status
         self.backlight_enabled = backlight_enabled
 
     def _init_connection(self):
-        self.bus = SMBus(self._port)
+        if self._transport == 'i2c-dev':
+            self.bus = I2CDev(self._port)
+        elif SMBus is None:
+            raise ImportError('The smbus transport requires the smbus or smbus2 package, '
+                              'install one of them or use transport=\'i2c-dev\'.')
+        else:
+            self.bus = SMBus(self._port)
+        # Waiting for the arbiter doesn't count as transmit time
+        self.bus = MeteredBus(self.bus, self._stats)
+        if self._arbiter is not None:
+            self.bus = arbiter.ArbitratedBus(self.bus, self._arbiter)
 
         if self._i2c_expander == 'PCF8574':
+            # Last state written to the PCF8574 outputs, unknown for now
+            self._pcf_state = None
             c.msleep(50)
         elif self._i2c_expander in ['MCP23008', 'MCP23017']:
             # Variable for storing data and applying bitmasks and shifting.
             self._mcp_data = 0
+            # Last state written to the GPIO register, unknown for now
+            self._mcp_state = None
 
             # Set iodir register value according to expander
             # If using MCP23017 set which gpio bank to use, A or B
@@ -180,20 +472,181 @@ class CharLCD(BaseCharLCD):
                 IODIR = MCP23008_IODIR
                 self._mcp_gpio = MCP23008_GPIO
             elif self._i2c_expander == 'MCP23017':
-                # Set gpio bank A or B
-                if self._expander_params['gpio_bank'] == 'A':
+                # Set gpio bank A or B. In 8 bit mode this is the control bank.
+                if self._expander_params['gpio_bank'] in ['A', 'BA']:
                     IODIR = MCP23017_IODIRA
                     self._mcp_gpio = MCP23017_GPIOA
-                elif self._expander_params['gpio_bank'] == 'B':
+                elif self._expander_params['gpio_bank'] in ['B', 'AB']:
                     IODIR = MCP23017_IODIRB
                     self._mcp_gpio = MCP23017_GPIOB
 
             # Set IO DIRection to output on all GPIOs (GP0-GP7)
             self.bus.write_byte_data(self._address, IODIR, 0x00)
 
+            if self.data_bus_mode == c.LCD_8BITMODE:
+                # The data bus is on the other bank
+                if self._mcp_gpio == MCP23017_GPIOA:
+                    self.bus.write_byte_data(self._address, MCP23017_IODIRB, 0x00)
+                    self._mcp_data_gpio = MCP23017_GPIOB
+                else:
+                    self.bus.write_byte_data(self._address, MCP23017_IODIRA, 0x00)
+                    self._mcp_data_gpio = MCP23017_GPIOA
+                self._mcp_bus_data = 0
+
+            if self._tx_buffer is not None:
+                # Byte mode, so that block writes don't advance the register
+                IOCON = MCP23008_IOCON if self._i2c_expander == 'MCP23008' else MCP23017_IOCON
+                iocon = self.bus.read_byte_data(self._address, IOCON)
+                self.bus.write_byte_data(self._address, IOCON, iocon | MCP230XX_IOCON_SEQOP)
+                if self._i2c_expander == 'MCP23017' and self.data_bus_mode == c.LCD_4BITMODE:
+                    # In byte mode the MCP23017 toggles between GPIOA and GPIOB,
+                    # the other bank keeps its current output latch value.
+                    OLAT = MCP23017_OLATB if self._mcp_gpio == MCP23017_GPIOA else MCP23017_OLATA
+                    self._mcp_other_bank = self.bus.read_byte_data(self._address, OLAT)
+
     def _close_connection(self):
-        # Nothing to do here?
-        pass
+        if self._transport == 'i2c-dev':
+            self.bus.close()
+
+    def _transaction_max(self):
+        """Maximum number of bytes per bus transaction when flushing. With a
+        bus arbiter, a transaction must fit into its ``max_hold`` time."""
+        if self._arbiter is None:
+            return I2C_DEV_WRITE_MAX
+        bus_clock = self._pacer.bus_clock if self._pacer is not None else 100000
+        size = int(self._arbiter.max_hold * bus_clock / 9)  # 9 bits per byte
+        return max(3, min(size, I2C_DEV_WRITE_MAX))
+
+    def _flush_buffer(self):
+        """Send the buffered expander states.
+
+        With the ``i2c-dev`` transport the buffer is sent in writes of up to
+        ``I2C_DEV_WRITE_MAX`` bytes. Otherwise it is sent as SMBus block
+        transactions: the PCF8574 treats every byte it receives as a new
+        output state, including the "command" byte of a block write, so the
+        buffer can be split into chunks of ``SMBUS_BLOCK_MAX + 1`` bytes. The
+        MCP230XX in byte mode takes blocks of ``SMBUS_BLOCK_MAX`` states
+        written to the GPIO register. On the MCP23017 the buffer holds pairs
+        of (own bank, other bank) states. With a bus arbiter, the chunks are
+        limited by ``_transaction_max()``.
+        """
+        if not self._tx_buffer:
+            return
+        data = self._tx_buffer
+        self._tx_buffer = bytearray()
+        size = self._transaction_max()
+        if self._i2c_expander == 'PCF8574':
+            if self._transport == 'smbus':
+                size = min(size, SMBUS_BLOCK_MAX + 1)
+            for i in range(0, len(data), size):
+                chunk = data[i:i + size]
+                if self._transport == 'i2c-dev':
+                    self.bus.write(self._address, chunk)
+                elif len(chunk) == 1:
+                    self.bus.write_byte(self._address, chunk[0])
+                else:
+                    self.bus.write_i2c_block_data(self._address, chunk[0], list(chunk[1:]))
+        elif self._i2c_expander in ['MCP23008', 'MCP23017']:
+            # Every chunk needs the register byte. The size is even, so every
+            # chunk starts at our own register.
+            size -= 1
+            if self._transport == 'smbus':
+                size = min(size, SMBUS_BLOCK_MAX)
+            size &= ~1
+            for i in range(0, len(data), size):
+                chunk = data[i:i + size]
+                if self._transport == 'i2c-dev':
+                    self.bus.write(self._address, bytearray([self._mcp_gpio]) + chunk)
+                else:
+                    self.bus.write_i2c_block_data(self._address, self._mcp_gpio, list(chunk))
+        if self._pacer is not None:
+            self._pacer.flushed()
+
+    def _wait(self, microseconds):
+        if self.busy_flag_polling and microseconds >= self._busy_poll_min_delay:
+            if self._wait_until_ready(microseconds):
+                if self._pacer is not None:
+                    self._pacer.ready()
+                return
+        if self._pacer is not None:
+            # The pacer already knows the execution time of the last instruction
+            return
+        if self._tx_buffer is not None:
+            if microseconds < 1000:
+                # Covered by the bus timing, see the ``batched`` argument
+                return
+            self._flush_buffer()
+        elif self._controllers > 1:
+            # The other controller can be written meanwhile
+            self._settle(microseconds)
+            return
+        self._sleep(microseconds)
+
+    def _select(self, mask):
+        super(CharLCD, self)._select(mask)
+        self._mcp_enable = (MCP230XX_E if mask & 1 else 0) | (self._mcp_e2 if mask & 2 else 0)
+
+    def _pace(self, nbytes):
+        """Wait until an enable edge of the selected controllers after
+        ``nbytes`` more bus bytes is safe."""
+        remaining = self._pacer.remaining(nbytes, self._target)
+        if remaining > 0 and self._tx_buffer:
+            padding = int(math.ceil(remaining / self._pacer.byte_time))
+            if padding <= PACING_MAX_PADDING:
+                # Short gaps are cheaper to fill by repeating the current state
+                # (no enable edge) than by flushing and sleeping.
+                for _ in range(padding):
+                    if self._i2c_expander == 'PCF8574':
+                        self._write_pcf8574(self._pcf_state)
+                    else:
+                        self._write_mcp230xx(self._mcp_state)
+                return
+            self._flush_buffer()
+            remaining = self._pacer.remaining(nbytes, self._target)
+        if remaining > 0:
+            self._stats['sleep_time'] += remaining
+            self._pacer.sleep(remaining)
+
+    def _write_costs(self):
+        """The bus time of a character and of an address instruction. With
+        the minimal nibble encoding, switching RS to instruction mode and back
+        costs an extra expander state each way."""
+        bus_clock = self._pacer.bus_clock if self._pacer is not None else 100000
+        byte_time = 9 * 1000000.0 / bus_clock  # 8 data bits plus ACK
+        nibbles = 1 if self.data_bus_mode == c.LCD_8BITMODE else 2
+        pair = 2 if self._i2c_expander == 'MCP23017' else 1
+        states = nibbles * (3 if self._nibble_encoding == 'classic' else 2) * pair  # see ``_encode``
+        switch = 2 * pair if self._nibble_encoding == 'minimal' else 0
+        if self._tx_buffer is not None:
+            # The bus time covers the delays, see ``_wait``
+            return states * byte_time, (states + switch) * byte_time
+        # Every state is a transaction of its own: address byte, (register) and state
+        states //= pair
+        switch //= pair
+        transaction = (2 if self._i2c_expander == 'PCF8574' else 3) * byte_time
+        pulses = 0 if self._pacer is not None else nibbles * (2 if self._controllers > 1 else 102)  # see ``_transmit``
+        delay = 0 if self._pacer is not None else 50
+        data = states * transaction + pulses
+        return data, data + switch * transaction + delay
+
+    def _read_busy_flag(self):
+        if self._i2c_expander != 'PCF8574':
+            # RW is not connected on the MCP230XX wiring
+            return None
+        self._flush_buffer()
+        # Data pins high so the PCF8574 can read them, RS low, RW high. Both
+        # nibbles have to be clocked out, the second one holds address bits.
+        state = 0xF0 | PIN_READ_WRITE | self._backlight
+        self.bus.write_byte(self._address, state)
+        self.bus.write_byte(self._address, state | PCF8574_E)
+        busy = self.bus.read_byte(self._address) & 0x80
+        self.bus.write_byte(self._address, state)
+        self.bus.write_byte(self._address, state | PCF8574_E)
+        self.bus.write_byte(self._address, state)
+        self._pcf_state = state
+        if self._pacer is not None:
+            self._pacer.sent(6)
+        return bool(busy)
 
     # Properties
 
@@ -203,65 +656,236 @@ class CharLCD(BaseCharLCD):
         elif self._i2c_expander in ['MCP23008', 'MCP23017']:
             return self._backlight == MCP230XX_BACKLIGHT
 
+    @batched
     def _set_backlight_enabled(self, value):
         if self._i2c_expander == 'PCF8574':
             self._backlight = PCF8574_BACKLIGHT if value else PCF8574_NOBACKLIGHT
-            self.bus.write_byte(self._address, self._backlight)
         elif self._i2c_expander in ['MCP23008', 'MCP23017']:
-            if value is True:
-                self._mcp_data |= MCP230XX_BACKLIGHT
-            else:
-                self._mcp_data &= MCP230XX_NOBACKLIGHT
-            self.bus.write_byte_data(self._address, self._mcp_gpio, self._mcp_data)
+            self._backlight = MCP230XX_BACKLIGHT if value else MCP230XX_NOBACKLIGHT
+        self._io(self._write_backlight)
 
     backlight_enabled = property(_get_backlight_enabled, _set_backlight_enabled,
             doc='Whether or not to enable the backlight. Either ``True`` or ``False``.')
 
+    @property
+    def arbiter(self):
+        """The :class:`~.arbiter.BusArbiter` of the I2C port, or None
+        without ``bus_arbiter``."""
+        return self._arbiter
+
     # Low level commands
 
-    def _send_data(self, value):
+    def _write_backlight(self):
+        # The backlight bit is part of every expander byte
+        self._wire_tables = {}
         if self._i2c_expander == 'PCF8574':
-            self.bus.write_byte(self._address, (c.RS_DATA | (value & 0xF0)) | self._backlight)
-            self._pulse_data(c.RS_DATA | (value & 0xF0))
-            self.bus.write_byte(self._address, (c.RS_DATA |
-                                               ((value << 4) & 0xF0)) | self._backlight)
-            self._pulse_data(c.RS_DATA | ((value << 4) & 0xF0))
+            self._write_pcf8574(self._backlight)
         elif self._i2c_expander in ['MCP23008', 'MCP23017']:
-            self._mcp_data |= MCP230XX_RS
-            self._pulse_data(value >> 4)
-            self._pulse_data(value & 0x0F)
-
-    def _send_instruction(self, value):
+            if self._backlight == MCP230XX_BACKLIGHT:
+                self._mcp_data |= MCP230XX_BACKLIGHT
+            else:
+                self._mcp_data &= MCP230XX_NOBACKLIGHT
+            self._write_mcp230xx(self._mcp_data)
+
+    def _write_pcf8574(self, value):
+        """Set the PCF8574 outputs, or queue the state in batched mode."""
+        if self._tx_buffer is None:
+            self.bus.write_byte(self._address, value)
+            if self._pacer is not None:
+                self._pacer.sent()
+        else:
+            self._tx_buffer.append(value)
+            if self._pacer is not None:
+                self._pacer.queued()
+        self._pcf_state = value
+
+    def _write_mcp230xx(self, value):
+        """Set the MCP230XX GPIO register, or queue the state in batched mode."""
+        if self._tx_buffer is None:
+            self.bus.write_byte_data(self._address, self._mcp_gpio, value)
+            if self._pacer is not None:
+                self._pacer.sent()
+        else:
+            if self._i2c_expander == 'MCP23017':
+                # Byte mode toggles between GPIOA and GPIOB, queue both
+                if self.data_bus_mode == c.LCD_8BITMODE:
+                    self._tx_buffer += bytearray([value, self._mcp_bus_data])
+                else:
+                    self._tx_buffer += bytearray([value, self._mcp_other_bank])
+                if self._pacer is not None:
+                    self._pacer.queued(2)
+            else:
+                self._tx_buffer.append(value)
+                if self._pacer is not None:
+                    self._pacer.queued()
+        self._mcp_state = value
+
+    def _wire_table(self, mode):
+        """Return the expander bytes that are written for each of the 256
+        data byte values, for the RS ``mode``, the selected controllers and
+        the current backlight state. The tables are built on first use and
+        dropped when the backlight changes."""
+        key = mode | self._target << 1
+        table = self._wire_tables.get(key)
+        if table is None:
+            table = [self._encode(value, mode) for value in range(256)]
+            self._wire_tables[key] = table
+        return table
+
+    def _encode(self, value, mode):
+        """Return the expander bytes for ``value``, assuming RS is already set
+        to ``mode``. On the MCP23017 in batched mode these are (own bank,
+        other bank) pairs."""
+        states = []
         if self._i2c_expander == 'PCF8574':
-            self.bus.write_byte(self._address, (c.RS_INSTRUCTION |
-                                               (value & 0xF0)) | self._backlight)
-            self._pulse_data(c.RS_INSTRUCTION | (value & 0xF0))
-            self.bus.write_byte(self._address, (c.RS_INSTRUCTION |
-                                               ((value << 4) & 0xF0)) | self._backlight)
-            self._pulse_data(c.RS_INSTRUCTION | ((value << 4) & 0xF0))
+            for nibble in (value & 0xF0, (value << 4) & 0xF0):
+                state = mode | nibble | self._backlight
+                if self._nibble_encoding == 'classic':
+                    states += [state, state]
+                states += [state | PCF8574_E, state]
         elif self._i2c_expander in ['MCP23008', 'MCP23017']:
-            self._mcp_data &= ~MCP230XX_RS
-            self._pulse_data(value >> 4)
-            self._pulse_data(value & 0x0F)
+            base = self._mcp_data & MCP230XX_BACKLIGHT
+            if mode == c.RS_DATA:
+                base |= MCP230XX_RS
+            if self.data_bus_mode == c.LCD_8BITMODE:
+                nibbles = (0,)
+            else:
+                nibbles = (value >> 4, value & 0x0F)
+            for nibble in nibbles:
+                state = base | nibble << MCP230XX_DATASHIFT
+                if self._nibble_encoding == 'classic':
+                    states.append(state)
+                states += [state | self._mcp_enable, state]
+            if self._i2c_expander == 'MCP23017' and self._tx_buffer is not None:
+                if self.data_bus_mode == c.LCD_8BITMODE:
+                    other = value
+                else:
+                    other = self._mcp_other_bank
+                states = [b for state in states for b in (state, other)]
+        return bytearray(states)
+
+    def _put(self, value, states):
+        """Write the expander ``states`` of the byte ``value`` from the wire
+        table: queue them in batched mode, otherwise write them one
+        transaction each. With the minimal nibble encoding RS is switched
+        first, with E low, as it has to be stable before E rises."""
+        wait = self._tx_buffer is None and self._pacer is None
+        if self._i2c_expander == 'PCF8574':
+            if self._nibble_encoding == 'minimal' and (self._pcf_state is None or
+                    (states[0] ^ self._pcf_state) & (PIN_REGISTER_SELECT | PIN_READ_WRITE)):
+                self._write_pcf8574(states[0] & ~PCF8574_E)
+                if wait:
+                    self._sleep(1)
+        else:
+            self._mcp_bus_data = value
+            if self.data_bus_mode == c.LCD_8BITMODE and self._tx_buffer is None:
+                # Data is latched on the falling edge, in batched mode the data
+                # bank is written together with the control bank.
+                self.bus.write_byte_data(self._address, self._mcp_data_gpio, value)
+                if self._pacer is not None:
+                    self._pacer.sent()
+            if self._nibble_encoding == 'minimal' and (self._mcp_state is None or
+                    (states[0] ^ self._mcp_state) & MCP230XX_RS):
+                self._write_mcp230xx(states[0] & ~self._mcp_enable)
+                if wait:
+                    self._sleep(1)
+        if self._tx_buffer is not None:
+            self._tx_buffer += states
+            if self._pacer is not None:
+                self._pacer.queued(len(states))
+        else:
+            self._transmit(states)
+        self._track(states)
 
-    def _pulse_data(self, value):
-        """Pulse the `enable` flag to process value."""
+    def _track(self, states):
+        """Remember the last expander state of ``states``."""
         if self._i2c_expander == 'PCF8574':
-            self.bus.write_byte(self._address, ((value & ~PCF8574_E) | self._backlight))
-            c.usleep(1)
-            self.bus.write_byte(self._address, value | PCF8574_E | self._backlight)
-            c.usleep(1)
-            self.bus.write_byte(self._address, ((value & ~PCF8574_E) | self._backlight))
-            c.usleep(100)
-        elif self._i2c_expander in ['MCP23008', 'MCP23017']:
-            self._mcp_data &= ~MCP230XX_DATAMASK
-            self._mcp_data |= value << MCP230XX_DATASHIFT
-            self._mcp_data &= ~MCP230XX_E
-            self.bus.write_byte_data(self._address, self._mcp_gpio, self._mcp_data)
-            c.usleep(1)
-            self._mcp_data |= MCP230XX_E
-            self.bus.write_byte_data(self._address, self._mcp_gpio, self._mcp_data)
-            c.usleep(1)
-            self._mcp_data &= ~MCP230XX_E
-            self.bus.write_byte_data(self._address, self._mcp_gpio, self._mcp_data)
-            c.usleep(100)
+            self._pcf_state = states[-1]
+        elif self._i2c_expander == 'MCP23017' and self._tx_buffer is not None:
+            # (own bank, other bank) pairs, see ``_encode``
+            self._mcp_data = self._mcp_state = states[-2]
+        else:
+            self._mcp_data = self._mcp_state = states[-1]
+
+    def _transmit(self, states):
+        """Write expander ``states`` one transaction each. Without a pacer the
+        states around the rising edge of E are held for a microsecond, and
+        the LCD gets 100 microseconds to latch each nibble (with two
+        controllers ``_send`` waits for that)."""
+        delays = self._transmit_delays
+        if delays is None or len(delays) != len(states):
+            nibbles = 1 if self.data_bus_mode == c.LCD_8BITMODE else 2
+            n = len(states) // nibbles
+            delays = ((0,) * (n - 3) + (1,) * min(n - 1, 2) + (100 if self._controllers == 1 else 0,)) * nibbles
+            self._transmit_delays = delays
+        address, pacer = self._address, self._pacer
+        if self._i2c_expander == 'PCF8574':
+            write = self.bus.write_byte
+            for state, delay in zip(states, delays):
+                write(address, state)
+                if pacer is not None:
+                    pacer.sent()
+                elif delay:
+                    self._sleep(delay)
+        else:
+            write, register = self.bus.write_byte_data, self._mcp_gpio
+            for state, delay in zip(states, delays):
+                write(address, register, state)
+                if pacer is not None:
+                    pacer.sent()
+                elif delay:
+                    self._sleep(delay)
+
+    def _send(self, value, mode, exec_time):
+        """Send a byte in two nibbles, or at once in 8 bit mode. The ``mode`` is either
+        ``RS_DATA`` or ``RS_INSTRUCTION``, ``exec_time`` is the time the LCD needs to
+        process it."""
+        if self._pacer is not None:
+            # Bytes up to and including the falling edge of the first nibble
+            self._pace(2 if self._nibble_encoding == 'minimal' else 3)
+        elif self._controllers > 1 and self._tx_buffer is None:
+            # Each controller only waits for its own execution time
+            self._wait_ready()
+        self._put(value, self._wire_table(mode)[value])
+        if self._pacer is not None:
+            self._pacer.settle(exec_time, self._target)
+        elif self._controllers > 1 and self._tx_buffer is None:
+            self._settle(100)  # commands need > 37us to settle
+
+    def _send_run(self, values):
+        """Send data bytes to consecutive addresses. In batched mode the
+        expander states of the whole run are joined from the wire table in
+        one go, unless the pacer has to space the characters (see
+        ``_run_paced``)."""
+        if self._tx_buffer is None or self._run_paced:
+            super(CharLCD, self)._send_run(values)
+            return
+        self._stats['data_bytes'] += len(values)
+        table = self._wire_table(c.RS_DATA)
+        if self._pacer is not None:
+            self._pace(2 if self._nibble_encoding == 'minimal' else 3)
+        # The first character may have to switch RS
+        self._put(values[0], table[values[0]])
+        states = b''.join([table[value] for value in values[1:]])
+        if states:
+            self._tx_buffer += states
+            if self._pacer is not None:
+                self._pacer.queued(len(states))
+            self._track(table[values[-1]])
+            if self._i2c_expander != 'PCF8574':
+                self._mcp_bus_data = values[-1]
+        if self._pacer is not None:
+            self._pacer.settle(c.EXEC_TIME, self._target)
+
+    def _send_data(self, value):
+        self._stats['data_bytes'] += 1
+        self._send(value, c.RS_DATA, c.EXEC_TIME)
+
+    def _send_instruction(self, value):
+        self._stats['instructions'] += 1
+        if value & c.LCD_SETDDRAMADDR:
+            self._stats['cursor_moves'] += 1
+        if value in [c.LCD_CLEARDISPLAY, c.LCD_RETURNHOME, c.LCD_RETURNHOME | 1]:
+            self._send(value, c.RS_INSTRUCTION, c.EXEC_TIME_LONG)
+        else:
+            self._send(value, c.RS_INSTRUCTION, c.EXEC_TIME)
@@ -22,23 +22,95 @@ CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
 """
 
 
+import functools
 from collections import namedtuple
+from contextlib import contextmanager
 
 from . import codecs
 from . import common as c
-from .compat import range
+from .compat import monotonic, range
+from .writebehind import WriteBehind
 
 
 LCDConfig = namedtuple('LCDConfig', 'rows cols dotsize')
 
 
+def batched(method):
+    """
+    Decorator for public methods: all bus traffic caused by the method is
+    buffered (if the subclass supports it) and flushed once the outermost
+    batched call returns. In write-behind mode the call only changes the frame
+    and the queue of the I/O thread, see :class:`~.writebehind.WriteBehind`.
+    """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if self._write_behind is not None and self._write_behind.is_client():
+            with self._write_behind.changes():
+                return method(self, *args, **kwargs)
+        self._batch_depth += 1
+        try:
+            return method(self, *args, **kwargs)
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._flush_buffer()
+    return wrapper
+
+
+class Frame(object):
+    """
+    Back buffer of a :meth:`BaseCharLCD.frame` block. It starts as a copy of
+    the display content (of the hidden page if ``flip`` is set), nothing is
+    sent to the LCD before the block is left.
+    """
+
+    def __init__(self, lcd, flip=False):
+        self.rows = lcd.lcd.rows
+        self.cols = lcd.lcd.cols
+        self.codec = lcd.codec
+        self.content = [bytearray(line) for line in (lcd._back_content if flip else lcd._content)]
+        self.dirty = set()  # Rows that were written to
+
+    def clear(self):
+        """Blank the whole frame."""
+        blank = b' ' * self.cols
+        for line in self.content:
+            line[:] = blank
+        self.dirty.update(range(self.rows))
+
+    def write(self, row, col, text):
+        """Put ``text`` at ``row``, ``col``. It is cut at the end of the row."""
+        self.write_encoded(row, col, self.codec.encode(text))
+
+    def write_encoded(self, row, col, encoded):
+        """Put character codes from the codec (a list, or a bytearray from
+        ``codec.encode_line()``) at ``row``, ``col``. They are cut at the end
+        of the row."""
+        if row not in range(self.rows) or col not in range(self.cols):
+            msg = 'Position {pos!r} invalid on a {rows}x{cols} LCD.'
+            raise ValueError(msg.format(pos=(row, col), rows=self.rows, cols=self.cols))
+        encoded = encoded[:self.cols - col]
+        if isinstance(encoded, list) and encoded and min(encoded) < 0:
+            raise ValueError('A frame has no line breaks, write every row on its own.')
+        self.content[row][col:col + len(encoded)] = encoded
+        self.dirty.add(row)
+
+
 # # # MAIN # # #
 
 class BaseCharLCD(object):
 
+    # Shortest delay for which polling the busy flag is worth it, in microseconds
+    _busy_poll_min_delay = 0
+
+    # Number of HD44780 controllers. 40x4 LCDs have two with an E line each,
+    # transports that can drive a second E line set this to 2.
+    _controllers = 1
+
     # Init, setup, teardown
 
-    def __init__(self, cols=20, rows=4, dotsize=8, charmap='A02', auto_linebreaks=True):
+    def __init__(self, cols=20, rows=4, dotsize=8, charmap='A02', auto_linebreaks=True,
+                 busy_flag_polling=False, write_behind=False):
         """
         Character LCD controller. Base class only, you should use a subclass.
 
@@ -56,9 +128,22 @@ class BaseCharLCD(object):
             auto_linebreaks:
                 Whether or not to automatically insert line breaks.
                 Default: True.
+            busy_flag_polling:
+                Poll the busy flag of the LCD instead of waiting fixed delays
+                after instructions. Needs a wiring that can read from the LCD
+                (RW connected). If the busy flag can't be read, the fixed
+                delays are used. Not used on LCDs with two controllers.
+                Default: False.
+            write_behind:
+                Don't wait for the bus. Writes only update an in-memory frame
+                and a queue, which a dedicated I/O thread sends to the LCD.
+                Pending writes to the same cell are merged. Use ``flush()``
+                to wait for the display. Default: False.
 
         """
         assert dotsize in [8, 10], 'The ``dotsize`` argument should be either 8 or 10.'
+        if self._controllers > 1 and (rows != 4 or cols > 40):
+            raise ValueError('LCDs with two controllers need 4 rows of up to 40 columns.')
 
         # Initialize codec
         if charmap == 'A00':
@@ -83,13 +168,66 @@ class BaseCharLCD(object):
             # For some 1 line displays you can select a 10px font.
             displayfunction |= c.LCD_5x10DOTS
 
-        # Create content cache
-        self._content = [[0x20] * cols for _ in range(rows)]
+        # Create content cache, one bytearray of character codes per row
+        self._content = [bytearray(b' ' * cols) for _ in range(rows)]
+
+        # A line of a two line LCD has 40 cells of DDRAM, a second page of
+        # up to 20 columns fits into the hidden ones, see ``frame()``. The
+        # content cache holds the page starting at the DDRAM column
+        # ``_page_offset`` (0 or cols), the hidden page is cached as well.
+        self._page_offset = 0
+        if rows == 2 and cols <= 20:
+            self._back_content = [bytearray(b' ' * cols) for _ in range(rows)]
+        else:
+            self._back_content = None
+
+        # The bitmaps in the 8 CGRAM locations, None if unknown
+        self._cgram = [None] * 8
+
+        # Counters, see ``stats()``. The transports update them.
+        self._stats = {
+            'instructions': 0,  # Instructions sent to the LCD
+            'data_bytes': 0,  # Characters and CGRAM bytes sent to the LCD
+            'bus_writes': 0,  # Write transactions (I2C) or enable pulses (GPIO)
+            'bus_reads': 0,  # Read transactions, e.g. busy flag polls
+            'cells_skipped': 0,  # Writes that the content cache found unchanged
+            'rows_skipped': 0,  # Rows of a frame or write that were unchanged as a whole
+            'cursor_moves': 0,  # Set DDRAM address instructions
+            'sleep_time': 0.0,  # Time spent sleeping, in seconds
+            'transmit_time': 0.0,  # Time spent in bus calls, in seconds
+        }
 
         # Set up auto linebreaks
         self.auto_linebreaks = auto_linebreaks
         self.recent_auto_linebreak = False
 
+        # Nesting depth of batched calls, see ``batch()``
+        self._batch_depth = 0
+
+        # The I/O thread is started once the display is initialized
+        self._write_behind = None
+
+        # The DDRAM address the address counter of each controller points to,
+        # None if unknown. The address instruction for a cursor move is only
+        # sent with the next write that needs it, see ``_write_runs()``.
+        self._address_counters = [None] * self._controllers
+
+        # With two controllers, rows 0 and 1 are the two lines of the first
+        # one and rows 2 and 3 of the second one. Instructions go to both,
+        # data only to the controller of its cell, see ``_select()``. Each
+        # controller is written while the other one executes, so they keep
+        # track of the time they are busy instead of sleeping.
+        self._ready_at = [0.0] * self._controllers
+        self._cursor_controller = 0
+        self._select((1 << self._controllers) - 1)
+
+        # Transport dependent, see ``_gap_limit()`` and ``_cell_at()``
+        self._max_gap = None
+        self._cells_by_address = None
+
+        # The busy flag can't be checked before the function set instruction
+        self.busy_flag_polling = False
+
         # Initialize display
         self._init_connection()
 
@@ -116,6 +254,7 @@ class BaseCharLCD(object):
         # Write configuration to display
         self.command(c.LCD_FUNCTIONSET | displayfunction)
         c.usleep(50)
+        self.busy_flag_polling = busy_flag_polling and self._controllers == 1
 
         # Configure display mode
         self._display_mode = c.LCD_DISPLAYON
@@ -123,9 +262,6 @@ class BaseCharLCD(object):
         self.command(c.LCD_DISPLAYCONTROL | self._display_mode | self._cursor_mode)
         c.usleep(50)
 
-        # Clear display
-        self.clear()
-
         # Configure entry mode
         self._text_align_mode = c.Alignment.left
         self._display_shift_mode = c.ShiftMode.cursor
@@ -133,26 +269,320 @@ class BaseCharLCD(object):
         self.command(c.LCD_ENTRYMODESET | self._text_align_mode | self._display_shift_mode)
         c.usleep(50)
 
+        # Clear display
+        self.clear()
+
+        if write_behind:
+            self._write_behind = WriteBehind(self)
+
     def close(self, clear=False):
         if clear:
             self.clear()
+        if self._write_behind is not None:
+            self._write_behind.close()
+            self._write_behind = None
+        self._flush_buffer()
         self._close_connection()
 
+    def flush(self, timeout=None):
+        """
+        Wait until all writes reached the display. Only needed in write-behind
+        mode, otherwise the writes are done once the call returns.
+
+        :param timeout: Maximum number of seconds to wait, or ``None`` to wait
+            as long as it takes.
+        :type timeout: float
+        :returns: ``False`` if the timeout expired, ``True`` otherwise.
+        :raises IOError: The last bus error of the I/O thread, if any.
+
+        """
+        if self._write_behind is not None:
+            return self._write_behind.flush(timeout)
+        self._flush_buffer()
+        return True
+
+    def stats(self):
+        """
+        Return a copy of the counters: instructions, data bytes, bus writes
+        and reads sent, cells and whole rows skipped by the content cache,
+        cursor moves, and the time spent sleeping and on the bus. Times are in
+        seconds.
+        """
+        return dict(self._stats)
+
+    @property
+    def queue_depth(self):
+        """Number of writes that are queued for the I/O thread in write-behind
+        mode. Merged writes to the same cell count once. Always 0 otherwise."""
+        if self._write_behind is None:
+            return 0
+        return self._write_behind.queue_depth
+
+    @contextmanager
+    def batch(self):
+        """
+        Context manager that collects the bus traffic of all calls inside the
+        block and sends it in as few bus transactions as possible once the
+        block is left. Blocks can be nested.
+
+        Subclasses that don't buffer bus traffic send everything immediately,
+        so this is always safe to use.
+
+        .. sourcecode:: python
+
+            >>> with lcd.batch():
+            ...     lcd.cursor_pos = (0, 0)
+            ...     lcd.write_string('Line 1')
+            ...     lcd.cursor_pos = (1, 0)
+            ...     lcd.write_string('Line 2')
+
+        In write-behind mode the I/O thread doesn't pick up any changes made
+        inside the block before it is left.
+
+        """
+        if self._write_behind is not None and self._write_behind.is_client():
+            with self._write_behind.changes():
+                yield
+            return
+        self._batch_depth += 1
+        try:
+            yield
+        finally:
+            self._batch_depth -= 1
+            if self._batch_depth == 0:
+                self._flush_buffer()
+
+    @contextmanager
+    def frame(self, flip=False):
+        """
+        Context manager for drawing a whole screen at once. The block draws
+        into a :class:`Frame`, which starts with the current content. Leaving
+        the block compares the frame with the display and sends the cells
+        that changed, as one batch. An exception inside the block leaves the
+        display unchanged.
+
+        With ``flip`` the frame starts with the content of the hidden page
+        (see :attr:`pages`). If writing the frame in place would take longer
+        than shifting the display, its changed cells are written there while
+        the current page stays visible, then the display is shifted over to
+        it and the page before becomes the hidden one. So a page change is
+        never visible for longer than the shift. In write-behind mode a flip
+        waits until the queued writes reached the display.
+
+        The cursor position is not changed by a frame.
+
+        .. sourcecode:: python
+
+            >>> with lcd.frame() as frame:
+            ...     frame.clear()
+            ...     frame.write(0, 0, 'Line 1')
+            ...     frame.write(1, 0, 'Line 2')
+
+        """
+        if flip and self._back_content is None:
+            raise ValueError('Page flips need a 2 row LCD with at most 20 columns.')
+        frame = Frame(self, flip)
+        yield frame
+        if not flip:
+            self._commit(frame.content, frame.dirty)
+        elif self._flip_pays(frame.content):
+            # The queued cells of the current page use its DDRAM columns
+            self.flush()
+            self._flip(frame.content)
+        else:
+            # The frame started with the hidden page, compare every row
+            self._commit(frame.content, range(self.lcd.rows))
+
+    def render(self, lines, flip=False):
+        """
+        Show ``lines`` as a frame, see :meth:`frame`. Lines are cut or padded
+        to the width of the display, missing rows are blank.
+        """
+        with self.frame(flip) as frame:
+            frame.clear()
+            for row, line in enumerate(lines[:self.lcd.rows]):
+                frame.write(row, 0, line)
+
+    @batched
+    def _commit(self, content, rows):
+        """Send the cells of ``content`` that differ from the display. Only
+        the ``rows`` that were written to are compared."""
+        cells = {}
+        stats = self._stats
+        for row in sorted(rows):
+            line, old = content[row], self._content[row]
+            if line == old:
+                stats['rows_skipped'] += 1
+                stats['cells_skipped'] += len(line)
+                continue
+            for col, value in enumerate(line):
+                if old[col] != value:
+                    cells[(row, col)] = value
+                else:
+                    stats['cells_skipped'] += 1
+        self._write_cells(cells)
+        self._update_cursor()
+
+    @batched
+    def _flip(self, content):
+        """Write the cells of ``content`` that differ from the hidden page
+        and show it, see ``frame()``."""
+        cells = {}
+        stats = self._stats
+        for row, line in enumerate(content):
+            old = self._back_content[row]
+            if line == old:
+                stats['rows_skipped'] += 1
+                stats['cells_skipped'] += len(line)
+                continue
+            for col, value in enumerate(line):
+                if old[col] != value:
+                    cells[(row, col)] = value
+                else:
+                    stats['cells_skipped'] += 1
+        self._set_page(self.lcd.cols - self._page_offset)
+        self._write_cells(cells)
+        if self._page_offset:
+            self.shift_display(-self.lcd.cols)
+        else:
+            # One instruction instead of a shift per column
+            self.command(c.LCD_RETURNHOME)
+            self._delay(2000)
+        self._update_cursor()
+
+    def _flip_pays(self, content):
+        """Whether shifting the display to the hidden page takes less time
+        than writing the cells of ``content`` that differ from the current
+        page, see ``_write_costs()``. The writes to the hidden page don't
+        count, the current page stays visible meanwhile."""
+        data, address = self._write_costs()
+        if self._page_offset:
+            # Back to the first page with the return home instruction
+            flip = address - 50 + 2000
+        else:
+            flip = self.lcd.cols * address
+        changed = sum(1 for line, old in zip(content, self._content) for a, b in zip(line, old) if a != b)
+        return flip < changed * data
+
+    def _set_page(self, offset):
+        """Make the page at the DDRAM column ``offset`` the current one of the
+        content cache."""
+        if offset != self._page_offset:
+            self._content, self._back_content = self._back_content, self._content
+            self._page_offset = offset
+            self._cells_by_address = None
+
+    @property
+    def pages(self):
+        """The number of pages of the size of the display that fit into its
+        DDRAM, 2 on LCDs with 2 rows of up to 20 columns. See :meth:`frame`."""
+        return 1 if self._back_content is None else 2
+
+    def _flush_buffer(self):
+        """Send buffered bus traffic. Subclasses that buffer must override this."""
+        pass
+
+    def _io(self, func, *args):
+        """Call ``func`` with ``args``, or queue the call for the I/O thread
+        in write-behind mode."""
+        if self._write_behind is not None and self._write_behind.is_client():
+            self._write_behind.put(func, *args)
+        else:
+            func(*args)
+
+    def _delay(self, microseconds):
+        """Give the LCD time to execute the last instruction."""
+        self._io(self._wait, microseconds)
+
+    def _wait(self, microseconds):
+        """Wait for the LCD to execute the last instruction.
+
+        Subclasses that know the timing of their bus may override this to
+        only wait for the part that the bus transfer does not already cover.
+        """
+        if self.busy_flag_polling and microseconds >= self._busy_poll_min_delay:
+            if self._wait_until_ready(microseconds):
+                return
+        if self._controllers > 1:
+            # The other controller can be written meanwhile
+            self._settle(microseconds)
+            return
+        self._sleep(microseconds)
+
+    def _sleep(self, microseconds):
+        """Sleep, and count the time in the stats."""
+        self._stats['sleep_time'] += microseconds / 1000000.0
+        c.usleep(microseconds)
+
+    def _select(self, mask):
+        """Send the next bytes to the controllers in the bit mask ``mask``
+        (bit 0 is the first controller). Transports with two enable lines
+        pulse the ones in ``_target``."""
+        self._target = mask
+
+    def _settle(self, microseconds):
+        """The selected controllers need ``microseconds`` before their next
+        byte, see ``_wait_ready()``."""
+        deadline = monotonic() + microseconds / 1000000.0
+        for controller in range(self._controllers):
+            if self._target >> controller & 1 and self._ready_at[controller] < deadline:
+                self._ready_at[controller] = deadline
+
+    def _wait_ready(self):
+        """Sleep until the selected controllers are ready for the next byte.
+        Replaces the fixed delays on LCDs with two controllers, the time the
+        other controller took meanwhile doesn't have to be waited again."""
+        ready = max(t for controller, t in enumerate(self._ready_at) if self._target >> controller & 1)
+        remaining = ready - monotonic()
+        if remaining > 0:
+            self._sleep(remaining * 1000000.0)
+
+    def _wait_until_ready(self, microseconds):
+        """Poll the busy flag until the LCD is ready.
+
+        Returns ``False`` if the busy flag can't be read, or if the LCD is still
+        busy after ten times the expected ``microseconds``. Polling is disabled
+        in both cases, so the caller should fall back to the fixed delay.
+        """
+        deadline = monotonic() + microseconds * 10 / 1000000.0
+        while True:
+            busy = self._read_busy_flag()
+            if busy is None or (busy and monotonic() > deadline):
+                self.busy_flag_polling = False
+                return False
+            if not busy:
+                return True
+
+    def _read_busy_flag(self):
+        """Read the busy flag. Returns ``None`` if the wiring doesn't allow reads."""
+        return None
+
+    def _ddram_address(self, row, col):
+        """Return the display data RAM address of a cell. With two
+        controllers, bit 7 is the controller of the cell."""
+        if self._controllers > 1:
+            controller, line = divmod(row, 2)
+            return controller << 7 | (line * 0x40 + col) & 0x7F
+        row_offsets = [0x00, 0x40, self.lcd.cols, 0x40 + self.lcd.cols]
+        if self._page_offset:
+            return row_offsets[row] + (col + self._page_offset) % 40
+        return (row_offsets[row] + col) & 0x7F
+
     # Properties
 
     def _get_cursor_pos(self):
         return self._cursor_pos
 
+    @batched
     def _set_cursor_pos(self, value):
         if not hasattr(value, '__getitem__') or len(value) != 2:
             raise ValueError('Cursor position should be determined by a 2-tuple.')
-        if value[0] not in list(range(self.lcd.rows)) or value[1] not in list(range(self.lcd.cols)):
+        if value[0] not in range(self.lcd.rows) or value[1] not in range(self.lcd.cols):
             msg = 'Cursor position {pos!r} invalid on a {lcd.rows}x{lcd.cols} LCD.'
             raise ValueError(msg.format(pos=value, lcd=self.lcd))
-        row_offsets = [0x00, 0x40, self.lcd.cols, 0x40 + self.lcd.cols]
-        self._cursor_pos = value
-        self.command(c.LCD_SETDDRAMADDR | row_offsets[value[0]] + value[1])
-        c.usleep(50)
+        self._cursor_pos = tuple(value)
+        # A hidden cursor is only moved by the next write
+        self._update_cursor()
 
     cursor_pos = property(_get_cursor_pos, _set_cursor_pos,
             doc='The cursor position as a 2-tuple (row, col).')
@@ -165,6 +595,7 @@ class BaseCharLCD(object):
         else:
             raise ValueError('Internal _text_align_mode has invalid value.')
 
+    @batched
     def _set_text_align_mode(self, value):
         if value == 'left':
             self._text_align_mode = c.Alignment.left
@@ -173,7 +604,7 @@ class BaseCharLCD(object):
         else:
             raise ValueError('Text align mode must be either `left` or `right`')
         self.command(c.LCD_ENTRYMODESET | self._text_align_mode | self._display_shift_mode)
-        c.usleep(50)
+        self._delay(50)
 
     text_align_mode = property(_get_text_align_mode, _set_text_align_mode,
             doc='The text alignment (``left`` or ``right``).')
@@ -186,6 +617,7 @@ class BaseCharLCD(object):
         else:
             raise ValueError('Internal _display_shift_mode has invalid value.')
 
+    @batched
     def _set_write_shift_mode(self, value):
         if value == 'cursor':
             self._display_shift_mode = c.ShiftMode.cursor
@@ -194,7 +626,7 @@ class BaseCharLCD(object):
         else:
             raise ValueError('Write shift mode must be either `cursor` or `display`.')
         self.command(c.LCD_ENTRYMODESET | self._text_align_mode | self._display_shift_mode)
-        c.usleep(50)
+        self._delay(50)
 
     write_shift_mode = property(_get_write_shift_mode, _set_write_shift_mode,
             doc='The shift mode when writing (``cursor`` or ``display``).')
@@ -202,10 +634,11 @@ class BaseCharLCD(object):
     def _get_display_enabled(self):
         return self._display_mode == c.LCD_DISPLAYON
 
+    @batched
     def _set_display_enabled(self, value):
         self._display_mode = c.LCD_DISPLAYON if value else c.LCD_DISPLAYOFF
         self.command(c.LCD_DISPLAYCONTROL | self._display_mode | self._cursor_mode)
-        c.usleep(50)
+        self._delay(50)
 
     display_enabled = property(_get_display_enabled, _set_display_enabled,
             doc='Whether or not to display any characters.')
@@ -220,6 +653,7 @@ class BaseCharLCD(object):
         else:
             raise ValueError('Internal _cursor_mode has invalid value.')
 
+    @batched
     def _set_cursor_mode(self, value):
         if value == 'hide':
             self._cursor_mode = c.CursorMode.hide
@@ -230,13 +664,15 @@ class BaseCharLCD(object):
         else:
             raise ValueError('Cursor mode must be one of `hide`, `line` or `blink`.')
         self.command(c.LCD_DISPLAYCONTROL | self._display_mode | self._cursor_mode)
-        c.usleep(50)
+        self._delay(50)
+        self._update_cursor()
 
     cursor_mode = property(_get_cursor_mode, _set_cursor_mode,
             doc='How the cursor should behave (``hide``, ``line`` or ``blink``).')
 
     # High level commands
 
+    @batched
     def write_string(self, value):
         """
         Write the specified unicode string to the display.
@@ -264,57 +700,91 @@ class BaseCharLCD(object):
             u'Temperature: 30\xb0C'
 
         """
-        encoded = self.codec.encode(value)  # type: List[int]
-        ignored = False
+        self._write_text(self.codec.encode_runs(value))
 
-        for [char, lookahead] in c.sliding_window(encoded, lookahead=1):
+    @batched
+    def write_encoded(self, encoded):  # type: (List[int]) -> None
+        """
+        Write a list of character codes as returned by ``codec.encode()``.
 
-            # If the previous character has been ignored, skip this one too.
-            if ignored is True:
-                ignored = False
-                continue
+        This behaves like :meth:`write_string`, but the text is only encoded
+        once when it is shown on several displays with the same charmap.
 
-            # Write regular chars
-            if char not in [codecs.CR, codecs.LF]:
-                self.write(char)
+        """
+        self._write_text(codecs.split_runs(encoded))
+
+    def _write_text(self, runs):
+        """Write bytearray runs of characters and the CR and LF between them,
+        see ``codecs.split_runs()``."""
+        cr, lf = codecs.CR, codecs.LF
+        rows, cols = self.lcd.rows, self.lcd.cols
+        i, n = 0, len(runs)
+        while i < n:
+            char = runs[i]
+            i += 1
+
+            # Write runs of regular chars
+            if char != cr and char != lf:
+                self._write_chars(char)
                 continue
 
             # We're now left with only CR and LF characters. If an auto
             # linebreak happened recently, and the lookahead matches too,
-            # ignore this write.
+            # ignore this write and the next one.
+            lookahead = runs[i] if i < n else None
             if self.recent_auto_linebreak is True:
-                crlf = (char == codecs.CR and lookahead == codecs.LF)
-                lfcr = (char == codecs.LF and lookahead == codecs.CR)
+                crlf = (char == cr and lookahead == lf)
+                lfcr = (char == lf and lookahead == cr)
                 if crlf or lfcr:
-                    ignored = True
+                    i += 1
                     continue
 
             # Handle newlines and carriage returns
-            row, col = self.cursor_pos
-            if char == codecs.LF:
-                if row < self.lcd.rows - 1:
-                    self.cursor_pos = (row + 1, col)
-                else:
-                    self.cursor_pos = (0, col)
-            elif char == codecs.CR:
-                if self.text_align_mode == 'left':
-                    self.cursor_pos = (row, 0)
-                else:
-                    self.cursor_pos = (row, self.lcd.cols - 1)
+            row, col = self._cursor_pos
+            if char == lf:
+                self._cursor_pos = (row + 1 if row < rows - 1 else 0, col)
+            elif self._text_align_mode == c.Alignment.left:
+                self._cursor_pos = (row, 0)
+            else:
+                self._cursor_pos = (row, cols - 1)
+
+        self._update_cursor()
 
+    @batched
     def clear(self):
         """Overwrite display with blank characters and reset cursor position."""
         self.command(c.LCD_CLEARDISPLAY)
         self._cursor_pos = (0, 0)
-        self._content = [[0x20] * self.lcd.cols for _ in range(self.lcd.rows)]
-        c.msleep(2)
-
+        blank = b' ' * self.lcd.cols
+        for line in self._content:
+            line[:] = blank
+        if self._back_content is not None:
+            for line in self._back_content:
+                line[:] = blank
+        # Clearing the display resets the display shift
+        self._set_page(0)
+        self._delay(2000)
+        if self._text_align_mode != c.Alignment.left:
+            # Clearing the display sets the entry mode to increment
+            self.command(c.LCD_ENTRYMODESET | self._text_align_mode | self._display_shift_mode)
+            self._delay(50)
+        self._update_cursor()
+
+    @batched
     def home(self):
         """Set cursor to initial position and reset any shifting."""
-        self.command(c.LCD_RETURNHOME)
         self._cursor_pos = (0, 0)
-        c.msleep(2)
+        if self._page_offset:
+            # Returning home shows the first page, copy the visible one there.
+            # The queued cells use the DDRAM columns of this page, see ``frame()``.
+            self.flush()
+            self._flip([bytearray(line) for line in self._content])
+            return
+        self.command(c.LCD_RETURNHOME)
+        self._delay(2000)
+        self._update_cursor()
 
+    @batched
     def shift_display(self, amount):
         """Shift the display. Use negative amounts to shift left and positive
         amounts to shift right."""
@@ -323,12 +793,15 @@ class BaseCharLCD(object):
         direction = c.LCD_MOVERIGHT if amount > 0 else c.LCD_MOVELEFT
         for i in range(abs(amount)):
             self.command(c.LCD_CURSORSHIFT | c.LCD_DISPLAYMOVE | direction)
-            c.usleep(50)
+            self._delay(50)
 
+    @batched
     def create_char(self, location, bitmap):
         """Create a new character.
 
-        The HD44780 supports up to 8 custom characters (location 0-7).
+        The HD44780 supports up to 8 custom characters (location 0-7). Only
+        the rows that differ from the bitmap the location already holds are
+        sent, see :class:`~.glyphs.GlyphManager` to allocate the locations.
 
         :param location: The place in memory where the character is stored.
             Values need to be integers between 0 and 7.
@@ -359,77 +832,335 @@ class BaseCharLCD(object):
         assert 0 <= location <= 7, 'Only locations 0-7 are valid.'
         assert len(bitmap) == 8, 'Bitmap should have exactly 8 rows.'
 
+        # Only the rows that differ from the bitmap already in CGRAM are sent
+        bitmap = tuple(bitmap)
+        current = self._cgram[location]
+        if current is None:
+            changed = list(range(8))
+        else:
+            changed = [i for i in range(8) if current[i] != bitmap[i]]
+        if not changed:
+            return
+        first, last = changed[0], changed[-1]
+
         # Store previous position
         pos = self.cursor_pos
 
-        # Write character to CGRAM
-        self.command(c.LCD_SETCGRAMADDR | location << 3)
-        for row in bitmap:
-            self._send_data(row)
+        # Write character to CGRAM, the address counter moves like for text
+        if self._text_align_mode == c.Alignment.right:
+            rows = range(last, first - 1, -1)
+        else:
+            rows = range(first, last + 1)
+        self.command(c.LCD_SETCGRAMADDR | location << 3 | rows[0])
+        for row in rows:
+            self._io(self._send_data, bitmap[row])
+        self._cgram[location] = bitmap
 
         # Restore cursor pos
         self.cursor_pos = pos
 
     # Mid level commands
 
+    @batched
     def command(self, value):
-        """Send a raw command to the LCD."""
-        self._send_instruction(value)
+        """Send a raw command to the LCD. With two controllers it goes to
+        both of them."""
+        if value & 0xF8 == c.LCD_CURSORSHIFT and self._write_behind is None:
+            # Moves the cursor from where it is supposed to be
+            self._sync_cursor()
+        if self._controllers > 1:
+            self._command_all(value)
+        else:
+            self._io(self._send_instruction, value)
+        self._track_address(value)
+
+    def _command_all(self, value):
+        """Send an instruction to all controllers. The cursor is only shown
+        by the controller of the cursor position."""
+        cursor = c.LCD_CURSORON | c.LCD_BLINKON
+        if value & 0xF8 == c.LCD_DISPLAYCONTROL and value & cursor:
+            self._cursor_controller = self._ddram_address(*self._cursor_pos) >> 7
+            for controller in range(self._controllers):
+                self._io(self._select, 1 << controller)
+                if controller == self._cursor_controller:
+                    self._io(self._send_instruction, value)
+                else:
+                    self._io(self._send_instruction, value & ~cursor)
+        else:
+            self._io(self._select, (1 << self._controllers) - 1)
+            self._io(self._send_instruction, value)
 
+    @batched
     def write(self, value):  # type: (int) -> None
         """Write a raw byte to the LCD."""
-
-        # Get current position
-        row, col = self._cursor_pos
-
-        # Write byte if changed
-        try:
-            if self._content[row][col] != value:
-                self._send_data(value)
-                self._content[row][col] = value  # Update content cache
-                unchanged = False
-            else:
-                unchanged = True
-        except IndexError as e:
-            # Position out of range
-            if self.auto_linebreaks is True:
-                raise e
-            self._send_data(value)
-            unchanged = False
-
-        # Update cursor position.
-        if self.text_align_mode == 'left':
-            if self.auto_linebreaks is False or col < self.lcd.cols - 1:
-                # No newline, update internal pointer
-                newpos = (row, col + 1)
-                if unchanged:
-                    self.cursor_pos = newpos
-                else:
-                    self._cursor_pos = newpos
+        self._write_chars(bytearray([value]))
+        self._update_cursor()
+
+    def _write_chars(self, chars):
+        """Write character codes at the cursor position and move the cursor,
+        with automatic line breaks. Codes are written as they are, including
+        CR and LF."""
+        rows, cols = self.lcd.rows, self.lcd.cols
+        step = 1 if self._text_align_mode == c.Alignment.left else -1
+        i, n = 0, len(chars)
+        while i < n:
+            row, col = self._cursor_pos
+            room = cols - col if step > 0 else col + 1
+            if not 0 < room <= cols:
+                # Past the end of the row without auto linebreaks, the LCD
+                # writes to DDRAM outside of the visible cells
+                self._write_offscreen(row, col, chars[i], step)
+                self._cursor_pos = (row, col + step)
                 self.recent_auto_linebreak = False
-            else:
+                i += 1
+                continue
+            count = min(room, n - i)
+            self._write_span(row, col, chars[i:i + count], step)
+            i += count
+            if count == room and self.auto_linebreaks:
                 # Newline, reset pointer
-                if row < self.lcd.rows - 1:
-                    self.cursor_pos = (row + 1, 0)
-                else:
-                    self.cursor_pos = (0, 0)
+                row = row + 1 if row < rows - 1 else 0
+                col = 0 if step > 0 else cols - 1
                 self.recent_auto_linebreak = True
+            else:
+                col += count * step
+                self.recent_auto_linebreak = False
+            self._cursor_pos = (row, col)
+
+    def _write_span(self, row, col, values, step):
+        """Write ``values`` to the cells of ``row`` from ``col`` on, in the
+        direction of ``step``. Unchanged cells are skipped."""
+        line = self._content[row]
+        count = len(values)
+        if step > 0:
+            unchanged = line[col:col + count] == values
         else:
-            if self.auto_linebreaks is False or col > 0:
-                # No newline, update internal pointer
-                newpos = (row, col - 1)
-                if unchanged:
-                    self.cursor_pos = newpos
+            unchanged = line[col - count + 1:col + 1] == values[::-1]
+        if unchanged:
+            if count == len(line):
+                self._stats['rows_skipped'] += 1
+            self._stats['cells_skipped'] += count
+            return
+        cells = {}
+        for value in values:
+            if line[col] != value:
+                cells[(row, col)] = value
+            col += step
+        self._stats['cells_skipped'] += len(values) - len(cells)
+        self._write_cells(cells)
+
+    def _write_cells(self, cells):
+        """Write ``cells`` ({(row, col): value}) to the LCD and the content
+        cache. In write-behind mode they are handed to the I/O thread."""
+        for (row, col), value in cells.items():
+            self._content[row][col] = value
+        if self._write_behind is not None:
+            for (row, col), value in cells.items():
+                self._write_behind.set_cell(row, col, value)
+            return
+        step = 1 if self._text_align_mode == c.Alignment.left else -1
+        self._address_counters = self._send_cells(cells, step, self._address_counters)
+
+    def _send_cells(self, cells, step, counters):
+        """Send ``cells`` in the runs planned by ``_runs()``. ``counters`` are
+        the DDRAM addresses the address counters of the controllers point to,
+        returns where they point to afterwards."""
+        if self._controllers == 1:
+            runs = self._runs(cells, step, counters[0])
+            return [self._write_runs(runs, step, counters[0])]
+        return self._write_interleaved(cells, step, counters)
+
+    def _write_interleaved(self, cells, step, counters):
+        """
+        Send ``cells`` to an LCD with two controllers. The writes of the
+        controllers alternate byte by byte: while one of them executes a
+        write, the next byte goes to the other one, see ``_wait_ready()``.
+        A full 40x4 frame takes about as long as one controller needs for
+        its half of it.
+        """
+        parts = [{} for _ in counters]
+        for (row, col), value in cells.items():
+            parts[row >> 1][(row, col)] = value
+        queues, counters = [], list(counters)
+        for controller, address in enumerate(counters):
+            queue = []
+            for start, values in self._runs(parts[controller], step, address):
+                if start != address:
+                    queue.append((c.RS_INSTRUCTION, start))
+                queue.extend((c.RS_DATA, value) for value in values)
+                address = start
+                for _ in values:
+                    address = self._next_address(address, step)
+            counters[controller] = address
+            queues.append(queue)
+        for i in range(max(len(queue) for queue in queues)):
+            for controller, queue in enumerate(queues):
+                if i >= len(queue):
+                    continue
+                mode, value = queue[i]
+                if mode == c.RS_INSTRUCTION:
+                    self._send_address(value)
+                    self._delay(50)
                 else:
-                    self._cursor_pos = newpos
-                self.recent_auto_linebreak = False
+                    self._select(1 << controller)
+                    self._send_data(value)
+        return counters
+
+    def _runs(self, cells, step, address=None):
+        """
+        Plan the writes of ``cells`` ({(row, col): value}): a list of
+        (address, values) runs of consecutive DDRAM addresses, in the order
+        the address counter moves (``step``). The address counter moves from
+        the end of a row to the row that continues it in DDRAM, e.g. from
+        row 0 to row 2 on a 20x4 LCD, so a run can span rows.
+
+        Between two changed cells, the visible cells in between are written
+        again from the content cache if that is cheaper than an address
+        instruction, see ``_gap_limit()``. The same goes for the gap from
+        ``address``, where the address counter points to before the first
+        write.
+        """
+        gap_limit = self._gap_limit()
+        order = sorted((self._ddram_address(row, col), value) for (row, col), value in cells.items())
+        if step < 0:
+            order.reverse()
+        runs = []
+        for target, value in order:
+            start, gap = address, []
+            while address is not None and address != target and len(gap) < gap_limit:
+                cell = self._cell_at(address)
+                if cell is None:
+                    break
+                gap.append(self._content[cell[0]][cell[1]])
+                address = self._next_address(address, step)
+            if address != target:
+                runs.append((target, [value]))
+            elif runs:
+                runs[-1][1].extend(gap)
+                runs[-1][1].append(value)
             else:
-                # Newline, reset pointer
-                if row < self.lcd.rows - 1:
-                    self.cursor_pos = (row + 1, self.lcd.cols - 1)
-                else:
-                    self.cursor_pos = (0, self.lcd.cols - 1)
-                self.recent_auto_linebreak = True
+                runs.append((start, gap + [value]))
+            address = self._next_address(target, step)
+        return runs
+
+    def _write_runs(self, runs, step, address=None):
+        """Send the ``runs`` planned by ``_runs()``. ``address`` is where the
+        address counter of the LCD points to, or None if unknown. Returns
+        where it points to afterwards."""
+        for start, values in runs:
+            if start != address:
+                self._send_address(start)
+                self._delay(50)
+            self._send_run(values)
+            address = start
+            for _ in values:
+                address = self._next_address(address, step)
+        return address
+
+    def _send_run(self, values):
+        """Send data bytes to consecutive DDRAM addresses. Subclasses may
+        send the whole run at once."""
+        for value in values:
+            self._send_data(value)
+
+    def _send_address(self, address):
+        """Point the address counter of the controller of ``address`` to it.
+        The following data bytes go to that controller as well."""
+        if self._controllers > 1:
+            self._select(1 << (address >> 7))
+        self._send_instruction(c.LCD_SETDDRAMADDR | address & 0x7F)
+
+    def _next_address(self, address, step):
+        """The DDRAM address the address counter moves to from ``address``
+        after a write. In two line mode, the lines are 40 cells long and the
+        end of one line continues at the start of the other. The controller
+        bit of ``_ddram_address()`` stays."""
+        if self.lcd.rows == 1:
+            return (address + step) % 80
+        line, pos = divmod(address, 0x40)
+        pos += step
+        if pos > 0x27:
+            line, pos = line ^ 1, 0
+        elif pos < 0:
+            line, pos = line ^ 1, 0x27
+        return line * 0x40 + pos
+
+    def _cell_at(self, address):
+        """Return the (row, col) of a DDRAM address, or None if it is not visible."""
+        if self._cells_by_address is None:
+            self._cells_by_address = dict((self._ddram_address(row, col), (row, col))
+                                          for row in range(self.lcd.rows) for col in range(self.lcd.cols))
+        return self._cells_by_address.get(address)
+
+    def _gap_limit(self):
+        """The longest gap of unchanged cells that is cheaper to write again
+        than to skip with an address instruction, see ``_write_costs()``."""
+        if self._max_gap is None:
+            data, address = self._write_costs()
+            self._max_gap = int(address // data)
+        return self._max_gap
+
+    def _write_costs(self):
+        """
+        Return the time it takes to write one character and to send one
+        set DDRAM address instruction, in microseconds. Subclasses that know
+        their bus should override this.
+        """
+        return c.EXEC_TIME, c.EXEC_TIME + 50
+
+    def _write_offscreen(self, row, col, value, step):
+        """Write to the DDRAM address ``col`` would have, outside of the content cache."""
+        address = self._ddram_address(row, col)
+        controller = address >> 7
+        if self._write_behind is not None or self._address_counters[controller] != address:
+            self._io(self._send_address, address)
+            self._delay(50)
+        elif self._controllers > 1:
+            self._io(self._select, 1 << controller)
+        self._io(self._send_data, value)
+        self._address_counters[controller] = self._next_address(address, step)
+        if self._back_content is not None:
+            # The cell may belong to the hidden page
+            line, pos = divmod(address, 0x40)
+            col = (pos - (self.lcd.cols - self._page_offset)) % 40
+            if pos < 40 and col < self.lcd.cols:
+                self._back_content[line][col] = value
+
+    def _update_cursor(self):
+        """Move the address counter of the LCD to the cursor position while
+        the cursor is visible. A hidden cursor is left to the next write."""
+        if self._cursor_mode == c.CursorMode.hide:
+            return
+        if self._controllers > 1 and self._ddram_address(*self._cursor_pos) >> 7 != self._cursor_controller:
+            # Show the cursor on the other controller, see ``_command_all()``
+            self.command(c.LCD_DISPLAYCONTROL | self._display_mode | self._cursor_mode)
+            self._delay(50)
+        if self._write_behind is None:
+            self._sync_cursor()
+        else:
+            self._write_behind.move_cursor()
+
+    def _sync_cursor(self):
+        """Point the address counter of the LCD to the cursor position."""
+        address = self._ddram_address(*self._cursor_pos)
+        controller = address >> 7
+        if self._address_counters[controller] != address:
+            self._io(self._send_address, address)
+            self._delay(50)
+            self._address_counters[controller] = address
+
+    def _track_address(self, instruction):
+        """Keep track of the address counters of the LCD."""
+        if instruction & c.LCD_SETDDRAMADDR:
+            address = instruction & 0x7F
+        elif instruction in [c.LCD_CLEARDISPLAY, c.LCD_RETURNHOME, c.LCD_RETURNHOME | 1]:
+            address = 0
+        elif instruction & c.LCD_SETCGRAMADDR or instruction & 0xF8 == c.LCD_CURSORSHIFT:
+            address = None
+        else:
+            return
+        self._address_counters = [None if address is None else controller << 7 | address
+                                  for controller in range(self._controllers)]
 
     def cr(self):  # type: () -> None
         """Write a carriage return (``\\r``) character to the LCD."""
@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2013-2017 Danilo Bargen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+
+
+class Marquee(object):
+    """
+    A field of a row that scrolls text which is longer than the field.
+
+    Each :meth:`step` moves the text one cell to the left, after the end a
+    few blank cells follow before the text starts again. :meth:`write` puts
+    the visible part into a :class:`~.lcd.Frame`, so a step only sends the
+    cells of the field that changed and never touches the other cells of
+    the LCD. Text that fits is written once, padded with blanks, and does
+    not scroll. The caller decides how often to step.
+
+    :param row: The row of the field.
+    :type row: int
+    :param col: The column where the field starts.
+    :type col: int
+    :param width: The number of cells of the field.
+    :type width: int
+    :param encoded: The character codes of the text, see
+        :meth:`~.codecs.Codec.encode_line`.
+    :type encoded: bytearray
+    :param gap: The number of blank cells between the end and the start of
+        scrolling text.
+    :type gap: int
+
+    Example:
+
+    .. sourcecode:: python
+
+        >>> marquee = Marquee(0, 0, 16, lcd.codec.encode_line(long_name))
+        >>> while True:
+        ...     with lcd.frame() as frame:
+        ...         marquee.write(frame)
+        ...     marquee.step()
+        ...     time.sleep(0.5)
+
+    """
+
+    def __init__(self, row, col, width, encoded, gap=3):
+        if width < 1:
+            raise ValueError('A marquee needs a width of at least 1.')
+        self.row = row
+        self.col = col
+        self.width = width
+        self.text = bytearray(encoded)
+        self.offset = 0
+        if self.scrolling:
+            loop = self.text + bytearray(b' ' * gap)
+            self._loop = loop + loop[:width]
+        else:
+            self._loop = self.text + bytearray(b' ' * (width - len(self.text)))
+
+    @property
+    def scrolling(self):
+        """Whether the text is longer than the field."""
+        return len(self.text) > self.width
+
+    def window(self):
+        """The character codes the field shows now."""
+        return self._loop[self.offset:self.offset + self.width]
+
+    def step(self):
+        """Move the text one cell further."""
+        if self.scrolling:
+            self.offset = (self.offset + 1) % (len(self._loop) - self.width)
+
+    def write(self, frame):
+        """Put the visible part of the text into ``frame``."""
+        frame.write_encoded(self.row, self.col, self.window())
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import types
+
+import pytest
+
+# The repository root is the CraftBeerPi plugin, which imports cbpi. Load the
+# driver modules as a package of their own instead.
+if 'rplcd' not in sys.modules:
+    rplcd = types.ModuleType('rplcd')
+    rplcd.__path__ = [os.path.dirname(os.path.dirname(os.path.abspath(__file__)))]
+    sys.modules['rplcd'] = rplcd
+
+from rplcd import emulator, i2c  # noqa: E402
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Virtual time, and the emulated I2C bus for ``i2c.CharLCD``."""
+    clock = emulator.VirtualClock()
+    uninstall = clock.install()
+    monkeypatch.setattr(i2c, 'SMBus', emulator.SMBus)
+    monkeypatch.setattr(i2c, 'I2CDev', emulator.SMBus)
+    yield clock
+    uninstall()
+
+
+@pytest.fixture
+def pcf8574(clock):
+    """Create an emulated LCD behind a PCF8574 and its ``i2c.CharLCD``."""
+    lcds = []
+
+    def make(cols, rows, **kwargs):
+        hd = emulator.HD44780(cols, rows)
+        bus = emulator.Bus(port=1, clock=clock)
+        bus.attach(0x27, emulator.PCF8574(hd))
+        lcd = i2c.CharLCD('PCF8574', 0x27, cols=cols, rows=rows, **kwargs)
+        lcds.append(lcd)
+        return hd, lcd
+    yield make
+    for lcd in lcds:
+        lcd.close()
+
+
+@pytest.fixture
+def mcp230xx(clock):
+    """Create an emulated LCD behind a MCP23008 or MCP23017 and its ``i2c.CharLCD``."""
+    lcds = []
+
+    def make(chip, cols, rows, gpio_bank='A', **kwargs):
+        hd = emulator.HD44780(cols, rows)
+        bus = emulator.Bus(port=1, clock=clock)
+        bus.attach(0x20, emulator.MCP230XX(hd, chip, gpio_bank))
+        params = {'gpio_bank': gpio_bank} if chip == 'MCP23017' else None
+        lcd = i2c.CharLCD(chip, 0x20, expander_params=params, cols=cols, rows=rows, **kwargs)
+        lcds.append(lcd)
+        return hd, lcd
+    yield make
+    for lcd in lcds:
+        lcd.close()
+
+
+@pytest.fixture
+def trace(monkeypatch):
+    """Record the bytes an emulated HD44780 latches from now on, as
+    ('I', instruction) and ('D', data) tuples."""
+    def start(hd):
+        log = []
+        execute, write = hd._execute, hd._write
+
+        def _execute(t, value):
+            log.append(('I', value))
+            execute(t, value)
+
+        def _write(t, value):
+            log.append(('D', value))
+            write(t, value)
+        monkeypatch.setattr(hd, '_execute', _execute)
+        monkeypatch.setattr(hd, '_write', _write)
+        return log
+    return start
@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+"""
+Bus arbiter tests.
+"""
+from rplcd import emulator
+from rplcd.arbiter import bus_arbiter
+from rplcd.displays import Display, parse_displays, prometheus_metrics
+
+
+def test_max_hold_keeps_the_shortest():
+    assert bus_arbiter(7).max_hold == 0.002
+    assert bus_arbiter(7, max_hold=0.001).max_hold == 0.001
+    assert bus_arbiter(7, max_hold=0.005).max_hold == 0.001
+    assert bus_arbiter(7).max_hold == 0.001
+
+
+def test_metrics_show_arbiter_stats(clock):
+    hd = emulator.HD44780(20, 4)
+    bus = emulator.Bus(port=1, clock=clock)
+    bus.attach(0x27, emulator.PCF8574(hd))
+    display = Display(parse_displays('0x27@1')[0])
+    display.open()
+    try:
+        display.draw(['Hello'])
+        display.lcd.flush()
+        text = prometheus_metrics([display])
+    finally:
+        display.close()
+    holds = [line for line in text.splitlines() if line.startswith('lcddisplay_bus_holds_total{port="1"}')]
+    assert len(holds) == 1 and int(holds[0].split()[-1]) > 0
+    assert 'lcddisplay_bus_hold_limit_seconds{port="1"} %r' % bus_arbiter(1).max_hold in text
+    assert 'lcddisplay_bus_overruns_total{port="1"}' in text
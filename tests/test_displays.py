@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""
+Tests of the LCD_Displays parameter.
+"""
+import pytest
+
+from rplcd import emulator
+from rplcd.displays import open_lcd, parse_displays
+
+MCP23017_OLATB = 0x15
+
+
+def test_40x4_on_mcp23017():
+    config, = parse_displays('0x20@1 40x4 MCP23017:A')
+    assert (config.cols, config.rows, config.expander, config.gpio_bank) == (40, 4, 'MCP23017', 'A')
+
+
+def test_40x4_on_pcf8574_is_rejected():
+    with pytest.raises(ValueError, match='needs a MCP23008 or MCP23017'):
+        parse_displays('0x27@1 40x4')
+
+
+def test_40x4_e2_pin(clock):
+    config, = parse_displays('0x20@1 40x4 MCP23017:AB e2=3')
+    assert config.e2 == 3
+    hd0, hd1 = emulator.HD44780(40, 2), emulator.HD44780(40, 2)
+    bus = emulator.Bus(port=1, clock=clock)
+    bus.attach(0x20, emulator.MCP230XX(hd0, 'MCP23017', 'AB', lcd2=hd1, pin_e2=3))
+    lcd = open_lcd(config)
+    try:
+        lcd.render(['one', 'two', 'three', 'four'])
+        lcd.flush()
+        assert [line.rstrip() for line in hd0.text() + hd1.text()] == ['one', 'two', 'three', 'four']
+        assert hd0.violations == hd1.violations == []
+    finally:
+        lcd.close()
+    with pytest.raises(ValueError, match='only used by 40x4'):
+        parse_displays('0x20@1 20x4 MCP23017:AB e2=3')
+
+
+def test_batched_and_transport():
+    default, unbatched = parse_displays('0x27; 0x26 batched=off transport=smbus')
+    assert (default.batched, default.transport) == (None, 'i2c-dev')
+    assert (unbatched.batched, unbatched.transport) == (False, 'smbus')
+    with pytest.raises(ValueError, match='unknown setting'):
+        parse_displays('0x27 batched=yes')
+
+
+def test_mcp23017_other_bank_is_left_alone(clock):
+    hd = emulator.HD44780(20, 4)
+    bus = emulator.Bus(port=1, clock=clock)
+    mcp = bus.attach(0x20, emulator.MCP230XX(hd, 'MCP23017', 'A'))
+    lcd = open_lcd(parse_displays('0x20@1 MCP23017:A')[0])
+    try:
+        # Another plugin switches a relay on bank B
+        emulator.SMBus(1).write_byte_data(0x20, MCP23017_OLATB, 0x01)
+        lcd.render(['Hello', 'World'])
+        lcd.flush()
+        assert hd.text()[:2] == ['Hello'.ljust(20), 'World'.ljust(20)]
+        assert mcp.registers[MCP23017_OLATB] == 0x01
+    finally:
+        lcd.close()
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+Frame tests against the HD44780 emulator: atomic commits and the runs
+planned by the cost model.
+"""
+import pytest
+
+from rplcd import common as c
+
+MODES = [
+    {},
+    {'batched': True},
+    {'batched': True, 'nibble_encoding': 'minimal', 'bus_clock': 100000},
+]
+
+
+def addresses(log):
+    return [value for rs, value in log if rs == 'I' and value & c.LCD_SETDDRAMADDR]
+
+
+def data(log):
+    return [value for rs, value in log if rs == 'D']
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'write_behind': True}])
+def test_frame_is_sent_when_left(pcf8574, trace, kwargs):
+    hd, lcd = pcf8574(20, 4, **kwargs)
+    log = trace(hd)
+    with lcd.frame() as frame:
+        for row in range(4):
+            frame.write(row, 0, 'Row %d' % row)
+        lcd.flush()
+        assert log == []
+        assert lcd.queue_depth == 0
+    lcd.flush()
+    assert [line.rstrip() for line in hd.text()] == ['Row 0', 'Row 1', 'Row 2', 'Row 3']
+    assert hd.violations == []
+
+
+def test_frame_exception_leaves_display(pcf8574, trace):
+    hd, lcd = pcf8574(20, 4)
+    lcd.render(['before'])
+    log = trace(hd)
+    with pytest.raises(ZeroDivisionError):
+        with lcd.frame() as frame:
+            frame.write(0, 0, 'after')
+            1 / 0
+    assert log == []
+    assert hd.text()[0].rstrip() == lcd._content[0].decode().rstrip() == 'before'
+
+
+@pytest.mark.parametrize('kwargs', MODES)
+def test_gaps_up_to_the_limit_are_rewritten(pcf8574, trace, kwargs):
+    hd, lcd = pcf8574(20, 4, **kwargs)
+    limit = lcd._gap_limit()
+    assert limit >= 1
+    lcd.render(['abcdefghijklmnopqrst'])
+    log = trace(hd)
+    # A gap of ``limit`` unchanged cells is written again
+    with lcd.frame() as frame:
+        frame.write(0, 2, 'X')
+        frame.write(0, 3 + limit, 'Y')
+    assert addresses(log) == [c.LCD_SETDDRAMADDR | 2]
+    assert len(data(log)) == limit + 2
+    # A longer one is skipped with an address instruction
+    del log[:]
+    with lcd.frame() as frame:
+        frame.write(0, 10, 'X')
+        frame.write(0, 12 + limit, 'Y')
+    assert addresses(log) == [c.LCD_SETDDRAMADDR | 10, c.LCD_SETDDRAMADDR | 12 + limit]
+    assert data(log) == [ord('X'), ord('Y')]
+    assert hd.text()[0] == lcd._content[0].decode()
+    assert hd.violations == []
+
+
+@pytest.mark.parametrize('kwargs', MODES)
+def test_run_continues_in_ddram_row(pcf8574, trace, kwargs):
+    """On a 20x4 LCD, row 2 continues row 0 in DDRAM."""
+    hd, lcd = pcf8574(20, 4, **kwargs)
+    log = trace(hd)
+    with lcd.frame() as frame:
+        frame.write(0, 19, 'A')
+        frame.write(2, 0, 'B')
+    assert addresses(log) == [c.LCD_SETDDRAMADDR | 19]
+    assert data(log) == [ord('A'), ord('B')]
+    assert hd.text()[0][19] == 'A' and hd.text()[2][0] == 'B'
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+GlyphManager tests against the HD44780 emulator.
+"""
+from rplcd.glyphs import GlyphManager
+
+
+def bitmap(n):
+    return tuple((n + row) & 0x1F for row in range(8))
+
+
+def test_evicts_least_recently_used_invisible_glyph(pcf8574):
+    hd, lcd = pcf8574(20, 4)
+    glyphs = GlyphManager([lcd])
+    for n in range(10):
+        glyphs.register(n, bitmap(n))
+    codes = [glyphs.code(n) for n in range(8)]
+    assert sorted(codes) == list(range(8))
+    # Nothing is freed before a release
+    assert glyphs.code(8) is None
+    # Glyphs 0 and 1 are on screen, 2 was used again and is the most recent
+    lcd.write_string(glyphs.char(0) + glyphs.char(1))
+    glyphs.code(2)
+    glyphs.release()
+    location = glyphs.code(8)
+    assert location == codes[3]
+    assert hd.glyph(location) == list(bitmap(8))
+    assert glyphs.code(9) == codes[4]
+    # The visible glyphs keep their locations
+    assert glyphs.code(0) == codes[0] and glyphs.code(1) == codes[1]
+    assert hd.glyph(codes[0]) == list(bitmap(0))
+    assert hd.violations == []
+
+
+def test_never_repoints_visible_location(pcf8574):
+    hd, lcd = pcf8574(20, 4)
+    glyphs = GlyphManager([lcd])
+    for n in range(9):
+        glyphs.register(n, bitmap(n))
+    lcd.write_string(''.join(glyphs.char(n) for n in range(8)))
+    glyphs.release()
+    assert glyphs.char(8, '?') == '?'
+    for location in range(8):
+        assert hd.glyph(location) == list(bitmap(location))
+
+
+def test_same_bitmap_shares_location(pcf8574):
+    hd, lcd = pcf8574(20, 4)
+    glyphs = GlyphManager([lcd])
+    glyphs.register('a', bitmap(1))
+    glyphs.register('b', bitmap(1))
+    writes = hd.writes
+    assert glyphs.code('a') == glyphs.code('b')
+    assert hd.writes - writes == 8
+
+
+def test_replacing_glyph_uploads_changed_rows(pcf8574):
+    hd, lcd = pcf8574(20, 4)
+    glyphs = GlyphManager([lcd])
+    for n in range(8):
+        glyphs.register(n, bitmap(n))
+    codes = [glyphs.code(n) for n in range(8)]
+    glyphs.release()
+    # Replaces glyph 0, the least recently used one, in CGRAM
+    glyphs.register('bar', bitmap(0)[:7] + (31,))
+    writes = hd.writes
+    assert glyphs.code('bar') == codes[0]
+    assert hd.writes - writes == 1
+    assert hd.glyph(codes[0]) == list(bitmap(0)[:7] + (31,))
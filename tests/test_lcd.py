@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+"""
+Character write tests against the HD44780 emulator.
+"""
+
+
+def test_write_skips_unchanged_cell(pcf8574, monkeypatch):
+    hd, lcd = pcf8574(16, 2)
+    lcd.write(ord('a'))
+    lcd.cursor_pos = (0, 0)
+    written = []
+    monkeypatch.setattr(lcd, '_write_cells', written.append)
+    lcd.write(ord('a'))
+    assert written == []
+    assert lcd.cursor_pos == (0, 1)
+    assert hd.text() == ['a               ', '                ']
@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Marquee tests against the HD44780 emulator.
+"""
+from rplcd.marquee import Marquee
+
+
+def test_scrolls_only_its_field(pcf8574, trace):
+    hd, lcd = pcf8574(20, 4)
+    lcd.render(['Step:', '', '', 'end'])
+    marquee = Marquee(0, 6, 5, lcd.codec.encode_line('Mash in'), gap=2)
+    assert marquee.scrolling
+    shown = []
+    log = trace(hd)
+    for _ in range(10):
+        del log[:]
+        with lcd.frame() as frame:
+            marquee.write(frame)
+        marquee.step()
+        shown.append(hd.text()[0][6:11])
+        # Only cells of the field were written
+        assert len([rs for rs, _ in log if rs == 'D']) <= 5
+        assert hd.text()[0][:6] == 'Step: ' and hd.text()[0][11:] == ' ' * 9
+        assert hd.text()[3].rstrip() == 'end'
+    # After the text and the gap it starts again
+    assert shown == ['Mash ', 'ash i', 'sh in', 'h in ', ' in  ', 'in  M', 'n  Ma', '  Mas', ' Mash',
+                     'Mash ']
+    assert hd.violations == []
+
+
+def test_short_text_is_padded(pcf8574):
+    hd, lcd = pcf8574(16, 2)
+    lcd.render(['x' * 16, 'y' * 16])
+    marquee = Marquee(1, 2, 6, lcd.codec.encode_line('Boil'))
+    assert not marquee.scrolling
+    marquee.step()
+    with lcd.frame() as frame:
+        marquee.write(frame)
+    assert hd.text() == ['x' * 16, 'yyBoil  yyyyyyyy']
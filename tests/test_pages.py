@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+"""
+Page flip tests against the HD44780 emulator.
+"""
+import pytest
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'write_behind': True}])
+def test_home_keeps_flipped_page(pcf8574, kwargs):
+    hd, lcd = pcf8574(16, 2, **kwargs)
+    lcd.render(['a' * 16, 'b' * 16])
+    lcd.render(['0123456789abcdef', 'fedcba9876543210'], flip=True)
+    lcd.flush()
+    assert hd.text() == ['0123456789abcdef', 'fedcba9876543210']
+    lcd.home()
+    lcd.write_string('X')
+    lcd.flush()
+    assert hd.text() == ['X123456789abcdef', 'fedcba9876543210']
+    assert hd.violations == []
@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+"""
+Wire encoding tests against the HD44780 emulator: every transport mode has
+to deliver the same instructions and data to the LCD.
+"""
+import pytest
+
+from rplcd import emulator
+
+PCF8574_MODES = [
+    {'batched': True},
+    {'nibble_encoding': 'minimal'},
+    {'nibble_encoding': 'minimal', 'batched': True},
+    {'nibble_encoding': 'minimal', 'batched': True, 'transport': 'i2c-dev', 'bus_clock': 100000},
+    {'bus_clock': 100000},
+]
+
+MCP230XX_MODES = [
+    ('MCP23008', 'A', {}),
+    ('MCP23008', 'A', {'batched': True}),
+    ('MCP23008', 'A', {'nibble_encoding': 'minimal', 'batched': True}),
+    ('MCP23017', 'A', {'batched': True}),
+    ('MCP23017', 'B', {'batched': True, 'bus_clock': 100000}),
+    ('MCP23017', 'AB', {}),
+    ('MCP23017', 'AB', {'batched': True}),
+    ('MCP23017', 'BA', {'batched': True, 'transport': 'i2c-dev'}),
+]
+
+
+def draw(lcd):
+    """Text, line breaks, a custom character, cursor and entry modes."""
+    lcd.write_string('Hello world\r\nTemp 65.3 C')
+    lcd.create_char(2, (0, 1, 3, 7, 15, 31, 0, 21))
+    lcd.cursor_pos = (2, 18)
+    lcd.write_string('\x02 Kettle 1: Mash')
+    lcd.cursor_mode = 'blink'
+    lcd.text_align_mode = 'right'
+    lcd.cursor_pos = (3, 19)
+    lcd.write_string('tfel')
+    lcd.text_align_mode = 'left'
+    lcd.home()
+    lcd.write_string('H')
+
+
+def latched(hd, lcd, trace):
+    log = trace(hd)
+    draw(lcd)
+    lcd.flush()
+    assert hd.violations == []
+    return log
+
+
+@pytest.fixture
+def reference(pcf8574, trace):
+    """What the classic, unbatched PCF8574 mode latches."""
+    hd, lcd = pcf8574(20, 4)
+    return latched(hd, lcd, trace), hd.text()
+
+
+@pytest.mark.parametrize('kwargs', PCF8574_MODES)
+def test_pcf8574_modes_latch_the_same(pcf8574, trace, reference, kwargs):
+    hd, lcd = pcf8574(20, 4, **kwargs)
+    assert (latched(hd, lcd, trace), hd.text()) == reference
+
+
+@pytest.mark.parametrize('chip, gpio_bank, kwargs', MCP230XX_MODES)
+def test_mcp230xx_modes_latch_the_same(mcp230xx, trace, reference, chip, gpio_bank, kwargs):
+    hd, lcd = mcp230xx(chip, 20, 4, gpio_bank, **kwargs)
+    assert (latched(hd, lcd, trace), hd.text()) == reference
+    assert hd.glyph(2) == [0, 1, 3, 7, 15, 31, 0, 21]
+
+
+@pytest.mark.parametrize('bus_clock', [100000, 400000])
+def test_minimal_nibbles_against_latch_model(clock, trace, bus_clock):
+    """The minimal encoding drops states, the latch model checks that every
+    E edge still meets the setup and hold times and latches the same bytes
+    with fewer bytes on the bus."""
+    from rplcd import i2c
+    results = []
+    for encoding in ['classic', 'minimal']:
+        hd = emulator.HD44780(20, 4)
+        bus = emulator.Bus(port=1, bus_clock=bus_clock, clock=clock)
+        bus.attach(0x27, emulator.PCF8574(hd))
+        lcd = i2c.CharLCD('PCF8574', 0x27, nibble_encoding=encoding, batched=True, bus_clock=bus_clock)
+        try:
+            log = trace(hd)
+            before = bus.bytes
+            draw(lcd)
+            results.append((log, hd.text(), bus.bytes - before))
+        finally:
+            lcd.close()
+        assert hd.violations == []
+    (classic, classic_text, classic_bytes), (minimal, minimal_text, minimal_bytes) = results
+    assert (minimal, minimal_text) == (classic, classic_text)
+    assert minimal_bytes < classic_bytes * 0.75
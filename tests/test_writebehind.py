@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+"""
+Write-behind tests against the HD44780 emulator.
+"""
+import pytest
+
+
+@pytest.mark.parametrize('kwargs', [{}, {'batched': True, 'bus_clock': 100000}])
+def test_cursor_pos_moves_visible_cursor(pcf8574, kwargs):
+    hd, lcd = pcf8574(20, 2, write_behind=True, **kwargs)
+    lcd.cursor_mode = 'line'
+    lcd.write_string('c cZ0\naa')
+    lcd.flush()
+    assert hd.cursor_pos == (1, 7)
+    # Nothing but the cursor changes
+    lcd.cursor_pos = (1, 0)
+    lcd.flush()
+    assert hd.cursor_pos == (1, 0)
+    lcd.write_string('\r\n')
+    lcd.flush()
+    assert hd.cursor_pos == (0, 0)
+    assert hd.text() == ['c cZ0               ', '     aa             ']
+    assert hd.violations == []
+
+
+def test_bus_error_restores_lcd(pcf8574, caplog):
+    from rplcd import emulator
+    hd, lcd = pcf8574(20, 2, write_behind=True)
+    lcd._write_behind.retry_delay = 0.01
+    lcd.write_string('before')
+    lcd.flush()
+    # Unplugged while a glyph, the cursor mode and text are queued
+    bus = emulator.Bus.ports[1]
+    device = bus.devices.pop(0x27)
+    lcd.create_char(2, (1, 2, 3, 4, 5, 6, 7, 8))
+    lcd.cursor_mode = 'blink'
+    lcd.cursor_pos = (1, 0)
+    lcd.write_string('after\x02')
+    with pytest.raises(IOError):
+        lcd.flush()
+    assert 'LCD write failed' in caplog.text
+    bus.attach(0x27, device)
+    lcd.flush()
+    assert hd.glyph(2) == [1, 2, 3, 4, 5, 6, 7, 8]
+    assert hd.blink and not hd.cursor
+    assert hd.text() == ['before              ', 'after\x02              ']
+    assert hd.cursor_pos == (1, 6)
+    assert hd.violations == []
@@ -0,0 +1,253 @@
+# -*- coding: utf-8 -*-
+"""
+Copyright (C) 2013-2017 Danilo Bargen
+
+Permission is hereby granted, free of charge, to any person obtaining a copy of
+this software and associated documentation files (the "Software"), to deal in
+the Software without restriction, including without limitation the rights to
+use, copy, modify, merge, publish, distribute, sublicense, and/or sell copies of
+the Software, and to permit persons to whom the Software is furnished to do so,
+subject to the following conditions:
+
+The above copyright notice and this permission notice shall be included in all
+copies or substantial portions of the Software.
+
+THE SOFTWARE IS PROVIDED "AS IS", WITHOUT WARRANTY OF ANY KIND, EXPRESS OR
+IMPLIED, INCLUDING BUT NOT LIMITED TO THE WARRANTIES OF MERCHANTABILITY, FITNESS
+FOR A PARTICULAR PURPOSE AND NONINFRINGEMENT. IN NO EVENT SHALL THE AUTHORS OR
+COPYRIGHT HOLDERS BE LIABLE FOR ANY CLAIM, DAMAGES OR OTHER LIABILITY, WHETHER
+IN AN ACTION OF CONTRACT, TORT OR OTHERWISE, ARISING FROM, OUT OF OR IN
+CONNECTION WITH THE SOFTWARE OR THE USE OR OTHER DEALINGS IN THE SOFTWARE.
+
+"""
+
+
+import logging
+import threading
+from contextlib import contextmanager
+
+from . import common as c
+from .compat import monotonic
+
+
+logger = logging.getLogger(__name__)
+
+class WriteBehind(object):
+    """
+    I/O thread of a :class:`~.lcd.BaseCharLCD` in write-behind mode.
+
+    Callers only touch the in-memory frame (``lcd._content``) and the queue,
+    while holding the lock. Character writes are kept per cell, so a cell
+    that is written several times before the I/O thread gets to it is sent
+    once with its latest value. Everything else (instructions, delays,
+    backlight changes) is queued as calls in order. Pending cell writes are
+    moved into the queue before each call, so their order is kept.
+
+    The I/O thread takes the whole queue at once and runs it in a single
+    batch of the LCD, without holding the lock, so callers never wait for
+    the bus.
+
+    After a bus error the state of the LCD is unknown. The error is logged,
+    and the next batch sets the modes, the CGRAM and the whole frame again.
+
+    :param lcd: The LCD to drive.
+    :type lcd: :class:`~.lcd.BaseCharLCD`
+
+    """
+
+    # Seconds to wait before retrying after a bus error
+    retry_delay = 1.0
+
+    def __init__(self, lcd):
+        self._lcd = lcd
+        self._lock = threading.RLock()
+        self._cond = threading.Condition(self._lock)
+        self._calls = []  # Queued (func, args) tuples, func is None for cell writes
+        self._cells = {}  # Pending cell writes, (row, col) -> value
+        self._depth = 0  # Nesting depth of ``changes()``
+        self._running = 0  # Queue entries the I/O thread is working on
+        self._error = None  # Last bus error, raised by ``flush()``
+        self._cursor_address = None  # Where the last batch left the address counter, if known
+        self._lost = False  # Whether a bus error left the LCD in an unknown state
+        self._closed = False
+        # The entry mode the LCD is in, see ``_write_cells``
+        self._entry_left = lcd._text_align_mode == c.Alignment.left
+        self._thread = threading.Thread(target=self._run, name='lcd-write-behind')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def is_client(self):
+        """Whether the current thread is not the I/O thread."""
+        return threading.current_thread() is not self._thread
+
+    @property
+    def queue_depth(self):
+        """Number of queued calls and pending cell writes, including the ones
+        the I/O thread is working on."""
+        with self._lock:
+            return len(self._calls) + len(self._cells) + self._running
+
+    @contextmanager
+    def changes(self):
+        """Hold the lock while changing the frame or queueing calls. The I/O
+        thread is woken up once the outermost block is left."""
+        with self._lock:
+            self._depth += 1
+            try:
+                yield
+            finally:
+                self._depth -= 1
+                if self._depth == 0 and (self._calls or self._cells):
+                    self._cond.notify_all()
+
+    def set_cell(self, row, col, value):
+        """Queue a character write, replacing a pending one to the same cell."""
+        with self.changes():
+            self._cells[(row, col)] = value
+
+    def put(self, func, *args):
+        """Queue a call of ``func`` with ``args`` on the I/O thread."""
+        with self.changes():
+            if self._cells:
+                self._calls.append((None, (self._cells,)))
+                self._cells = {}
+            self._calls.append((func, args))
+
+    def move_cursor(self):
+        """Have the I/O thread point the address counter to the cursor. It
+        does so after every batch, so an empty batch is only queued if
+        nothing else is and the cursor moved."""
+        lcd = self._lcd
+        with self.changes():
+            if self._calls or self._cells:
+                return
+            if self._running or self._cursor_address != lcd._ddram_address(*lcd._cursor_pos):
+                self._calls.append((None, ({},)))
+
+    def flush(self, timeout=None):
+        """Wait until the queue is empty. Returns ``False`` on timeout.
+
+        Raises the last bus error of the I/O thread, if any.
+        """
+        deadline = None if timeout is None else monotonic() + timeout
+        with self._lock:
+            if self._depth:
+                # Inside changes(), the I/O thread was not woken up yet
+                self._cond.notify_all()
+            while (self._calls or self._cells or self._running) and self._error is None:
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - monotonic()
+                    if remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+            error, self._error = self._error, None
+        if error is not None:
+            raise error
+        return True
+
+    def close(self):
+        """Send everything that is queued and stop the I/O thread."""
+        with self._lock:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+
+    def _run(self):
+        lcd = self._lcd
+        while True:
+            with self._lock:
+                while not (self._calls or self._cells or self._closed):
+                    self._cond.wait()
+                if self._closed and not (self._calls or self._cells):
+                    return
+                calls = self._restore() if self._lost else []
+                calls.extend(self._calls)
+                if self._cells:
+                    calls.append((None, (self._cells,)))
+                self._calls = []
+                self._cells = {}
+                self._running = len(calls)
+                if lcd._cursor_mode != c.CursorMode.hide:
+                    # The cells were written with their own addresses
+                    address = lcd._ddram_address(*lcd._cursor_pos)
+                else:
+                    address = None
+            try:
+                with lcd.batch():
+                    for func, args in calls:
+                        if func is None:
+                            self._write_cells(*args)
+                        else:
+                            func(*args)
+                            if func == lcd._send_instruction:
+                                self._track(args[0])
+                    if address is not None:
+                        lcd._send_address(address)
+                        lcd._delay(50)
+                    self._cursor_address = address
+            except Exception as e:
+                with self._lock:
+                    if not self._lost:
+                        logger.warning('LCD write failed, retrying every %.1f s: %s', self.retry_delay, e)
+                    self._cursor_address = None
+                    self._error = e
+                    self._lost = True
+                    # The display content is unknown now, send the whole frame again
+                    for row, line in enumerate(lcd._content):
+                        for col, value in enumerate(line):
+                            self._cells[(row, col)] = value
+                    self._running = 0
+                    self._cond.notify_all()
+                    if self._closed:
+                        return
+                    self._cond.wait(self.retry_delay)
+            else:
+                with self._lock:
+                    if self._lost:
+                        logger.info('LCD write recovered')
+                        self._lost = False
+                    self._running = 0
+                    self._cond.notify_all()
+
+    def _restore(self):
+        """Calls that set the entry mode, the CGRAM and the display control
+        again after a bus error. The queued calls of the failed batch are
+        lost, and a CGRAM upload may have stopped halfway, so every bitmap in
+        ``lcd._cgram`` is sent in full. Called with the lock held."""
+        lcd = self._lcd
+        calls = []
+        if lcd._controllers > 1:
+            calls.append((lcd._select, ((1 << lcd._controllers) - 1,)))
+        calls.append((lcd._send_instruction, (c.LCD_ENTRYMODESET | c.LCD_ENTRYLEFT,)))
+        for location, bitmap in enumerate(lcd._cgram):
+            if bitmap is None:
+                continue
+            calls.append((lcd._send_instruction, (c.LCD_SETCGRAMADDR | location << 3,)))
+            calls.extend((lcd._send_data, (row,)) for row in bitmap)
+        calls.append((lcd._send_instruction,
+                      (c.LCD_ENTRYMODESET | lcd._text_align_mode | lcd._display_shift_mode,)))
+        value = c.LCD_DISPLAYCONTROL | lcd._display_mode | lcd._cursor_mode
+        cursor = c.LCD_CURSORON | c.LCD_BLINKON
+        if lcd._controllers > 1 and value & cursor:
+            # Only the controller of the cursor position shows it
+            lcd._cursor_controller = lcd._ddram_address(*lcd._cursor_pos) >> 7
+            for controller in range(lcd._controllers):
+                calls.append((lcd._select, (1 << controller,)))
+                calls.append((lcd._send_instruction,
+                              (value if controller == lcd._cursor_controller else value & ~cursor,)))
+        else:
+            calls.append((lcd._send_instruction, (value,)))
+        return calls
+
+    def _track(self, instruction):
+        """Keep track of the entry mode set by queued instructions."""
+        if instruction & 0xFC == c.LCD_ENTRYMODESET:
+            self._entry_left = bool(instruction & c.LCD_ENTRYLEFT)
+
+    def _write_cells(self, cells):
+        """Write ``cells`` in runs planned by the LCD, see ``BaseCharLCD._runs()``."""
+        lcd = self._lcd
+        step = 1 if self._entry_left else -1
+        lcd._send_cells(cells, step, [None] * lcd._controllers)